@@ -1,73 +1,240 @@
 import pyodbc
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 import re
+import json
+import time
+import random
+import argparse
+import threading
+from llmCache import CachedChatClient, StandInChatClient, LLMCacheMiss
 
-# Initialize the client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# LLM client, set up by configure_client(): OpenAI (or a stand-in) behind the response cache
+client = None
+LLM_CACHE_DIR = "./llm_cache"
+
+def configure_client(base_client=None, cache_dir=LLM_CACHE_DIR, replay_only=False):
+    """
+    Choose the client used for synonym requests.
+
+    base_client defaults to OpenAI; pass a StandInChatClient for offline tests.
+    With a cache_dir every answer is cached by request hash and replayed on
+    re-runs; replay_only answers from the cache alone and never calls the API.
+    """
+    global client
+    if base_client is None and not replay_only:
+        # Retries are handled in _chat so every worker backs off together on 429s
+        base_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    client = CachedChatClient(base_client, cache_dir, replay_only) if cache_dir else base_client
+    return client
+
+# Concurrent LLM calls and ingredients per request for process_ingredients
+LLM_MODEL = "gpt-3.5-turbo"
+MAX_CONCURRENT_REQUESTS = 8
+SYNONYM_BATCH_SIZE = 10
+# Answer budget per ingredient: up to 10 JSON entries of ~25-30 tokens each plus the key
+TOKENS_PER_INGREDIENT = 320
+MAX_ANSWER_TOKENS = 4096
+
+# Calls and tokens used by this run
+_usage_lock = threading.Lock()
+llm_usage = {'calls': 0, 'cached': 0, 'tokens': 0}
+
+# Shared pause after a rate-limit error: no worker sends a request before this time.monotonic() value
+_rate_limit_lock = threading.Lock()
+_rate_limited_until = 0.0
 
 # Database connection settings
 DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=GroceryDB;Trusted_Connection=yes;"
 
-def get_distinct_ingredients():
+def get_distinct_ingredients(conn=None):
     """Get distinct Curated values from IngredientName that aren't already processed"""
-    conn = pyodbc.connect(DB_CONNECTION_STRING)
+    own_connection = conn is None
+    if own_connection:
+        conn = pyodbc.connect(DB_CONNECTION_STRING)
     
     cursor = conn.cursor()
+    # One set difference (EXCEPT also removes duplicates) instead of a correlated NOT EXISTS per row
+    # Ordered, so batches (and their cached answers) stay stable between runs
     query = """
-    SELECT DISTINCT i.Curated
-    FROM IngredientName i
-    WHERE NOT EXISTS (
-        SELECT 1 FROM IngredientSynonyms s 
-        WHERE s.Name = i.Curated
-    )
-    AND i.Curated IS NOT NULL
+    SELECT Curated FROM IngredientName WHERE Curated IS NOT NULL
+    EXCEPT
+    SELECT Name FROM IngredientSynonyms WHERE Name IS NOT NULL
+    ORDER BY Curated
     """
     
     cursor.execute(query)
     results = [row[0] for row in cursor.fetchall()]
     cursor.close()
-    conn.close()
+    if own_connection:
+        conn.close()
     return results
 
-def save_synonyms_to_db(ingredient, synonym_data):
-    """Save the LLM synonyms to the database"""
-    conn = pyodbc.connect(DB_CONNECTION_STRING)
-    
-    cursor = conn.cursor()
-    
-    for order, (original_synonym, clean_synonym) in enumerate(synonym_data, start=1):
-        # Parse the synonym for region and misspellings
-        is_misspelling = 1 if "misspelling" in original_synonym.lower() else 0
-        
-        # Extract region if present (looking for patterns like "(Japanese)")
-        # Only look for region if it's not a misspelling
-        region = None
-        if not is_misspelling:
-            region_match = re.search(r'\(([^)]+)\)', original_synonym)
-            region = region_match.group(1) if region_match else None
-        
-        insert_query = """
+class SynonymWriter:
+    """
+    Buffer synonyms and write them to IngredientSynonyms in bulk over one connection.
+
+    Rows are sent with fast_executemany every flush_every ingredients, one
+    transaction per flush, so an ingredient is either fully saved or not at all
+    (and then still pending on the next run).
+
+    Usage:
+        with SynonymWriter(DB_CONNECTION_STRING) as writer:
+            writer.add(ingredient, synonyms)
+
+    Attributes:
+        conn: Long-lived database connection
+        flush_every (int): Ingredients buffered per bulk insert (default 50)
+        saved (int): Ingredients written so far
+    """
+    INSERT_SQL = """
         INSERT INTO IngredientSynonyms 
         (Name, Synonym, LLMReportOrder, IsMisspelling, Region, LLMText)
         VALUES (?, ?, ?, ?, ?, ?)
         """
-        
-        cursor.execute(insert_query, 
-                      ingredient, clean_synonym.lower(), order, is_misspelling, region, original_synonym)
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
 
-def get_llm_synonyms(term, max_retries=3):
+    def __init__(self, db_connection_string, flush_every=50):
+        self.conn = pyodbc.connect(db_connection_string)
+        self.cursor = self.conn.cursor()
+        self.cursor.fast_executemany = True
+        self.flush_every = flush_every
+        self.saved = 0
+        self._rows = []
+        self._ingredients = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, ingredient, synonym_data):
+        """
+        Queue one ingredient's synonyms.
+
+        synonym_data holds (llm_text, synonym, is_misspelling, region) tuples in the
+        order the LLM reported them.
+        """
+        for order, (llm_text, synonym, is_misspelling, region) in enumerate(synonym_data, start=1):
+            self._rows.append((ingredient, synonym.lower()[:100], order, int(is_misspelling), region, llm_text[:100]))
+        self._ingredients.append(ingredient)
+        if len(self._ingredients) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        rows, ingredients = self._rows, self._ingredients
+        self._rows, self._ingredients = [], []
+        try:
+            self.cursor.executemany(self.INSERT_SQL, rows)
+            self.conn.commit()
+            self.saved += len(ingredients)
+        except pyodbc.Error as e:
+            # Nothing of this flush was saved; the ingredients stay pending for the next run
+            self.conn.rollback()
+            print(f"Error saving synonyms for {len(ingredients)} ingredients ({', '.join(ingredients[:5])}...): {str(e)}")
+
+    def close(self):
+        self.flush()
+        self.cursor.close()
+        self.conn.close()
+
+def save_synonyms_to_db(ingredient, synonym_data):
+    """Save the LLM synonyms of one ingredient to the database"""
+    with SynonymWriter(DB_CONNECTION_STRING) as writer:
+        writer.add(ingredient, synonym_data)
+
+def _backoff_delay(attempt, base_delay, max_delay):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+def _retry_after(error):
+    """Seconds from the Retry-After header of a rate-limit response, if any"""
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _wait_for_rate_limit():
+    with _rate_limit_lock:
+        delay = _rate_limited_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def _pause_all(seconds):
+    global _rate_limited_until
+    with _rate_limit_lock:
+        _rate_limited_until = max(_rate_limited_until, time.monotonic() + seconds)
+
+def _record_usage(response):
+    usage = getattr(response, 'usage', None)
+    with _usage_lock:
+        if getattr(response, 'cached', False):
+            llm_usage['cached'] += 1
+        else:
+            llm_usage['calls'] += 1
+            llm_usage['tokens'] += usage.total_tokens if usage else 0
+
+def _chat(term, messages, max_tokens, response_format=None, max_retries=5, base_delay=1.0, max_delay=60.0):
+    """
+    Send one chat completion with backoff; returns (content, finish_reason), content None on failure.
+
+    A 429 pauses every worker (Retry-After, else exponential backoff with full
+    jitter); connection errors, timeouts and 5xx back off this worker only.
+    Other errors are not retried.
+    """
+    if client is None:
+        configure_client()
+    extra = {'response_format': response_format} if response_format else {}
+    for attempt in range(max_retries):
+        _wait_for_rate_limit()
+        try:
+            response = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=max_tokens,
+                **extra
+            )
+            _record_usage(response)
+            choice = response.choices[0]
+            return choice.message.content, getattr(choice, 'finish_reason', None)
+
+        except LLMCacheMiss:
+            print(f"No cached answer for {term} (replay-only)")
+            return None, None
+
+        except RateLimitError as e:
+            if attempt == max_retries - 1:
+                print(f"Rate limited on {term}, giving up after {max_retries} attempts")
+                return None, None
+            # Everyone waits, not just this worker, so the burst that caused the 429 drains
+            delay = _retry_after(e) or _backoff_delay(attempt, base_delay, max_delay)
+            print(f"Rate limited on {term}; pausing requests for {delay:.1f}s")
+            _pause_all(delay)
+
+        except (APIConnectionError, APITimeoutError, InternalServerError) as e:
+            print(f"Attempt {attempt + 1} for {term} failed: {str(e)}")
+            if attempt == max_retries - 1:
+                return None, None
+            time.sleep(_backoff_delay(attempt, base_delay, max_delay))
+
+        except Exception as e:
+            # Bad request, auth error, ...: retrying would fail the same way
+            print(f"Request for {term} failed: {str(e)}")
+            return None, None
+
+def get_llm_synonyms(term, max_retries=5):
     """
     Get culinary synonyms using OpenAI's latest API
     Args:
         term: The ingredient term to find synonyms for
-        max_retries: Number of retry attempts if API fails
+        max_retries: Number of attempts if API fails
     Returns:
-        List of tuples: (original_synonym, cleaned_synonym) or None if failed
+        List of tuples: (original_synonym, cleaned_synonym, is_misspelling, region) or None if failed
     """
     prompt = f"""List 5-10 culinary synonyms or alternative names for '{term}'.
     Include technical names, regional names, and common misspellings.
@@ -80,48 +247,192 @@ def get_llm_synonyms(term, max_retries=3):
     # - mochi rice
     # - khao niao (Thai)
                    
-    for attempt in range(max_retries):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a culinary expert assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=200
-            )
-            
-            content = response.choices[0].message.content
-            synonyms = []
-            
-            for line in content.split("\n"):
-                if line.strip():
-                    original = line.strip("- ").strip()
-                    clean = re.sub(r'\s*\([^)]+\)', '', original).strip()
-                    synonyms.append((original, clean))
-            
-            return synonyms
-            
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {str(e)}")
-            if attempt == max_retries - 1:
-                return None
+    content, finish_reason = _chat(term, [
+        {"role": "system", "content": "You are a culinary expert assistant."},
+        {"role": "user", "content": prompt}
+    ], max_tokens=200, max_retries=max_retries)
+    if content is None:
+        return None
+    
+    lines = content.split("\n")
+    if finish_reason == 'length':
+        # Cut off mid-answer: the last line may be half a name
+        lines = lines[:-1]
+    synonyms = []
+    for line in lines:
+        if line.strip():
+            original = line.strip("- ").strip()
+            clean = re.sub(r'\s*\([^)]+\)', '', original).strip()
+            # Free text: guess the flags from annotations like "(misspelling)" or "(Japanese)"
+            is_misspelling = "misspelling" in original.lower()
+            region = None
+            if not is_misspelling:
+                region_match = re.search(r'\(([^)]+)\)', original)
+                region = region_match.group(1) if region_match else None
+            synonyms.append((original, clean, is_misspelling, region))
+    
+    return synonyms
 
-def process_ingredients():
-    """Main function to process all ingredients"""
-    ingredients = get_distinct_ingredients()
+def _parse_batch_entries(entries):
+    """Validate one ingredient's JSON entries; returns synonym tuples or None if unusable"""
+    if not isinstance(entries, list):
+        return None
+    synonyms = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        synonym = entry.get('synonym')
+        if not isinstance(synonym, str) or not synonym.strip() or len(synonym) > 100:
+            continue
+        synonym = synonym.strip()
+        is_misspelling = entry.get('misspelling') is True
+        region = entry.get('region') if isinstance(entry.get('region'), str) and entry.get('region').strip() else None
+        region = region.strip()[:100] if region else None
+        # Same shape as the free-text answers stored in LLMText
+        llm_text = f"{synonym} (misspelling)" if is_misspelling else f"{synonym} ({region})" if region else synonym
+        synonyms.append((llm_text, synonym, is_misspelling, region))
+    return synonyms or None
+
+BATCH_INSTRUCTIONS = (
+    "For each ingredient in the JSON array below, list 5-10 culinary synonyms or alternative names, "
+    "including technical names, regional names and common misspellings.\n"
+    "Answer with one JSON object that has exactly these ingredients as keys. Each value is an array of "
+    '{"synonym": string, "misspelling": boolean, "region": string or null}, where region names the '
+    "language or place a regional name comes from.\n"
+)
+
+def _answer_key(term):
+    # Per-ingredient cache key; changing the model or the instructions starts over
+    return CachedChatClient.item_key(model=LLM_MODEL, prompt=BATCH_INSTRUCTIONS, item=term)
+
+def get_llm_synonyms_batch(terms, max_retries=5):
+    """
+    Get synonyms for several ingredients in one request with a JSON answer.
+
+    The system prompt and instructions are paid once per batch instead of once
+    per ingredient, and misspelling/region come back as fields instead of being
+    parsed out of free text. An answer cut off at max_tokens can't be parsed, so
+    the batch is split in half and each half asked again. With the response
+    cache, each ingredient's validated answer is also cached on its own and
+    only the ingredients without one are sent.
+    Returns:
+        Dict: term -> list of (llm_text, synonym, is_misspelling, region) for every
+        term with a valid answer; missing or malformed terms are left out
+    """
+    if client is None:
+        configure_client()
+    item_cache = client if isinstance(client, CachedChatClient) else None
+    results = {}
+    if item_cache is not None:
+        for term in terms:
+            synonyms = _parse_batch_entries(item_cache.get_item(_answer_key(term)))
+            if synonyms:
+                results[term] = synonyms
+        if results:
+            with _usage_lock:
+                llm_usage['cached'] += len(results)
+            terms = [term for term in terms if term not in results]
+            if not terms:
+                return results
+
+    prompt = BATCH_INSTRUCTIONS + f"Ingredients: {json.dumps(list(terms), ensure_ascii=False)}"
+    content, finish_reason = _chat(f"batch of {len(terms)}", [
+        {"role": "system", "content": "You are a culinary expert assistant. You answer in JSON only."},
+        {"role": "user", "content": prompt}
+    ], max_tokens=min(MAX_ANSWER_TOKENS, 100 + TOKENS_PER_INGREDIENT * len(terms)),
+        response_format={"type": "json_object"}, max_retries=max_retries)
+    if content is None:
+        return results
+    if finish_reason == 'length':
+        if len(terms) == 1:
+            print(f"Answer for {terms[0]} was cut off at the token limit")
+            return results
+        print(f"Answer for batch of {len(terms)} was cut off at the token limit, splitting it")
+        middle = len(terms) // 2
+        return {**results,
+                **get_llm_synonyms_batch(terms[:middle], max_retries),
+                **get_llm_synonyms_batch(terms[middle:], max_retries)}
+    try:
+        answer = json.loads(content)
+    except ValueError:
+        print(f"Unparseable JSON for batch of {len(terms)}")
+        return results
+    if not isinstance(answer, dict):
+        return results
+
+    # Match keys loosely: the model sometimes changes case or spacing
+    by_key = {' '.join(str(key).lower().split()): value for key, value in answer.items()}
+    for term in terms:
+        entries = by_key.get(' '.join(term.lower().split()))
+        synonyms = _parse_batch_entries(entries)
+        if synonyms:
+            results[term] = synonyms
+            if item_cache is not None:
+                item_cache.put_item(_answer_key(term), entries)
+    return results
+
+def process_ingredients(max_workers=MAX_CONCURRENT_REQUESTS, batch_size=SYNONYM_BATCH_SIZE, flush_every=50):
+    """
+    Main function to process all ingredients.
+
+    Ingredients are sent batch_size at a time; any ingredient missing or invalid
+    in a batch answer is re-queued as a request of its own. Up to max_workers
+    LLM calls run at once; results are saved on this thread as they arrive, so
+    an interrupted run keeps everything up to the last flush of flush_every ingredients.
+    """
+    if client is None:
+        configure_client()
+    writer = SynonymWriter(DB_CONNECTION_STRING, flush_every)
+    ingredients = get_distinct_ingredients(writer.conn)
+    answered = failed = 0
     
-    for i, ingredient in enumerate(ingredients, start=1):
-        print(f"Processing {i}/{len(ingredients)}: {ingredient}")
-        
-        synonyms = get_llm_synonyms(ingredient)
+    with writer, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for i in range(0, len(ingredients), batch_size):
+            batch = ingredients[i:i + batch_size]
+            pending[executor.submit(get_llm_synonyms_batch, batch)] = batch
         
-        if synonyms:
-            save_synonyms_to_db(ingredient, synonyms)
-            print(f"Saved {len(synonyms)} synonyms for {ingredient}")
-        else:
-            print(f"Failed to get synonyms for {ingredient}")
+        while pending:
+            future = next(as_completed(pending))
+            batch = pending.pop(future)
+            results = future.result()
+            
+            for ingredient in batch:
+                synonyms = results.get(ingredient)
+                if synonyms:
+                    writer.add(ingredient, synonyms)
+                    answered += 1
+                    print(f"Got {len(synonyms)} synonyms for {ingredient} ({answered + failed}/{len(ingredients)})")
+                elif len(batch) > 1:
+                    # Re-queue on its own; a one-ingredient answer is rarely incomplete
+                    pending[executor.submit(get_llm_synonyms_batch, [ingredient])] = [ingredient]
+                else:
+                    failed += 1
+                    print(f"Failed to get synonyms for {ingredient}")
+    
+    if ingredients:
+        print(f"Done: {writer.saved} saved, {failed} failed; {llm_usage['cached']} answers replayed from cache, "
+              f"{llm_usage['calls']} calls, {llm_usage['tokens']} tokens "
+              f"({llm_usage['calls'] / len(ingredients):.2f} calls, "
+              f"{llm_usage['tokens'] / len(ingredients):.0f} tokens per ingredient)")
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Build ingredient synonyms with an LLM')
+    parser.add_argument('--cache_dir', default=LLM_CACHE_DIR, help='Directory of cached LLM answers')
+    parser.add_argument('--no_cache', action='store_true', help='Call the API without the response cache')
+    parser.add_argument('--replay_only', action='store_true',
+                        help='Use cached answers only and never call the API (offline rebuilds)')
+    parser.add_argument('--stand_in', action='store_true', help='Answer with the offline stand-in client')
+    args = parser.parse_args()
+    if args.replay_only and args.no_cache:
+        parser.error('--replay_only needs the response cache')
+    return args
 
 if __name__ == "__main__":
-    process_ingredients()
\ No newline at end of file
+    args = parse_arguments()
+    configure_client(
+        base_client=StandInChatClient() if args.stand_in else None,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        replay_only=args.replay_only
+    )
+    process_ingredients()
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from types import SimpleNamespace
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay-only mode when a request has no cached answer"""
+
+
+def _response(content, total_tokens=0, cached=False, finish_reason='stop'):
+    """Minimal stand-in for an OpenAI ChatCompletion: choices[0].message.content, finish_reason and usage"""
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)],
+        usage=SimpleNamespace(total_tokens=total_tokens),
+        cached=cached
+    )
+
+
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class CachedChatClient:
+    """
+    Content-addressed on-disk cache in front of an OpenAI-compatible client.
+
+    Each chat completion is stored under the sha256 of the request (model,
+    messages, temperature, max_tokens, response_format), so re-running a build
+    after a crash or for a schema change replays finished answers instead of
+    paying for them again, while a prompt tweak naturally misses. In replay-only
+    mode a miss raises LLMCacheMiss instead of calling the API. Files are written
+    atomically, so concurrent workers and interrupted runs never leave half an entry.
+
+    Only complete answers are cached: finish_reason must be 'stop', and a
+    json_object request must have returned valid JSON. A truncated or broken
+    answer is returned to the caller but asked again on the next run instead of
+    being replayed forever.
+
+    Callers that batch several items per request can also store each item's
+    validated answer on its own (item_key/get_item/put_item), so a re-run hits
+    the cache however the items happen to be grouped into requests.
+
+    Usage:
+        client = CachedChatClient(OpenAI(), "./llm_cache")
+        response = client.chat.completions.create(model=..., messages=[...])
+
+    Attributes:
+        client: Wrapped client (OpenAI or StandInChatClient); None for replay-only use
+        cache_dir (str): Directory holding the cached answers (two-level fan-out by hash)
+        replay_only (bool): Never call the wrapped client
+        hits (int): Requests answered from the cache
+        misses (int): Requests sent to the wrapped client (or refused in replay-only mode)
+    """
+    def __init__(self, client, cache_dir, replay_only=False):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.replay_only = replay_only or client is None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self.create))
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _hash(parts):
+        canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def request_key(cls, **request):
+        return cls._hash(
+            {name: request.get(name) for name in ('model', 'messages', 'temperature', 'max_tokens', 'response_format')}
+        )
+
+    @classmethod
+    def item_key(cls, **parts):
+        """Key for a per-item answer, e.g. item_key(model=..., prompt=..., item=...)"""
+        return cls._hash(parts)
+
+    def _path(self, key, kind=''):
+        return os.path.join(self.cache_dir, kind, key[:2], key + '.json')
+
+    def _write_json(self, path, value):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def get_item(self, key):
+        """Answer stored with put_item, or None; counts as a hit"""
+        try:
+            with open(self._path(key, 'items'), encoding='utf-8') as f:
+                value = json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put_item(self, key, value):
+        self._write_json(self._path(key, 'items'), {'value': value})
+
+    @staticmethod
+    def cacheable(request, content, finish_reason):
+        """True for answers worth replaying: finished normally and, for JSON requests, valid JSON"""
+        if finish_reason != 'stop' or content is None:
+            return False
+        if (request.get('response_format') or {}).get('type') == 'json_object':
+            try:
+                json.loads(content)
+            except ValueError:
+                return False
+        return True
+
+    def create(self, **request):
+        key = self.request_key(**request)
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            # Entries from before finish_reason was stored are checked by content alone
+            if self.cacheable(request, entry['content'], entry.get('finish_reason', 'stop')):
+                with self._lock:
+                    self.hits += 1
+                return _response(entry['content'], cached=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with self._lock:
+            self.misses += 1
+        if self.replay_only:
+            raise LLMCacheMiss(f"No cached answer for request {key[:12]}")
+
+        response = self.client.chat.completions.create(**request)
+        content = response.choices[0].message.content
+        finish_reason = getattr(response.choices[0], 'finish_reason', None)
+        if not self.cacheable(request, content, finish_reason):
+            return response
+        usage = getattr(response, 'usage', None)
+        self._write_json(path, {'model': request.get('model'), 'content': content, 'finish_reason': finish_reason,
+                                'total_tokens': usage.total_tokens if usage else None})
+        return response
+
+
+class StandInChatClient:
+    """
+    Offline, deterministic replacement for the OpenAI client in tests and dry runs.
+
+    Answers both prompt styles of BuildSynonym.py: the JSON batch prompt
+    ("Ingredients: [...]") gets a JSON object keyed by ingredient, the single
+    prompt ("... names for '<term>'") gets a bulleted list. Synonyms are derived
+    from the ingredient name, so runs are repeatable and cost nothing.
+
+    Usage:
+        client = StandInChatClient()
+        BuildSynonym.configure_client(client)
+
+    Attributes:
+        calls (int): Requests answered so far
+    """
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=_Completions(self.create))
+
+    @staticmethod
+    def _synonyms(term):
+        words = term.split()
+        return [
+            {"synonym": ' '.join(reversed(words)) if len(words) > 1 else term + 's',
+             "misspelling": False, "region": None},
+            {"synonym": term + ' powder', "misspelling": False, "region": None},
+            {"synonym": term[:-2] + term[-1] + term[-2] if len(term) > 2 else term * 2,
+             "misspelling": True, "region": None},
+            {"synonym": term + 'o', "misspelling": False, "region": "Italian"}
+        ]
+
+    def create(self, **request):
+        self.calls += 1
+        prompt = request['messages'][-1]['content']
+        batch = re.search(r'Ingredients: (\[.*\])\s*$', prompt, re.S)
+        if batch:
+            terms = json.loads(batch.group(1))
+            content = json.dumps({term: self._synonyms(term) for term in terms})
+        else:
+            term = re.search(r"names for '(.+?)'", prompt).group(1)
+            content = '\n'.join(
+                f"- {s['synonym']}" + (" (misspelling)" if s['misspelling'] else f" ({s['region']})" if s['region'] else '')
+                for s in self._synonyms(term)
+            )
+        return _response(content, total_tokens=len(prompt.split()) + len(content.split()))
@@ -0,0 +1,338 @@
+# In-memory resolution of user-typed pantry items to canonical ingredient names.
+# Built once from Sqlite/ingredient_synonyms.csv or the IngredientSynonyms table and saved to a
+# compact file, so lookups need no SQL round trips: exact names hit a hash map, typos go through a
+# SymSpell-style delete index and prefixes (for type-ahead) through a sorted term list.
+
+import os
+import re
+import csv
+import time
+import pickle
+import random
+import argparse
+from bisect import bisect_left
+
+FORMAT_VERSION = 2
+
+# Queries this short allow fewer edits: two edits turn "moz" into almost any 3-letter term
+SHORT_QUERY_DISTANCES = ((2, 0), (4, 1))
+
+
+def normalize(text):
+    """Lower-case, keep letters, digits, hyphens and apostrophes, collapse whitespace"""
+    return ' '.join(re.sub(r"[^\w\s'-]", ' ', str(text).lower()).split())
+
+
+def _deletes(word, max_distance):
+    """All strings reachable from word by removing up to max_distance characters"""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 once it is known to be larger"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SynonymResolver:
+    """
+    Resolve pantry input to canonical ingredients with exact, fuzzy and prefix lookups.
+
+    Every synonym and every canonical name is a term. Exact lookups are a dict
+    hit. Fuzzy lookups follow SymSpell: two indexes map deletions of each term's
+    first and last prefix_length characters (up to max_distance) to term ids, so
+    a query only generates its own deletions and verifies the few terms found in
+    both with an edit distance, instead of comparing against all terms. Prefix completion
+    bisects the sorted term list. A term that maps to several canonicals lists
+    them best first: the canonical itself, then by LLMReportOrder. Short queries
+    get a smaller edit budget (SHORT_QUERY_DISTANCES).
+
+    Terms known only as misspellings (IsMisspelling) still resolve typed input,
+    but rank after proper names at the same distance, are flagged by
+    is_misspelling() and are never offered by complete().
+
+    Usage:
+        resolver = SynonymResolver.from_csv("../Sqlite/ingredient_synonyms.csv")
+        resolver.save("synonyms.idx")
+        resolver = SynonymResolver.load("synonyms.idx")
+        resolver.resolve("glutinus rice")        # -> 'sticky rice'
+        resolver.complete("moz")                 # -> [('mozzarella', [...]), ...]
+
+    Attributes:
+        max_distance (int): Largest edit distance accepted by fuzzy lookups (default 2)
+        prefix_length (int): Characters of each term indexed for fuzzy lookups (default 7)
+        canonicals (list): Canonical ingredient names
+        terms (list): Sorted normalized terms
+        term_canonicals (list): Per term, the ids of its canonicals, best first
+        misspelled (frozenset): Ids of terms that only occur as misspellings
+    """
+    def __init__(self, max_distance=2, prefix_length=7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.canonicals = []
+        self.terms = []
+        self.term_canonicals = []
+        self.misspelled = frozenset()
+        self._term_ids = {}
+        self._deletes = {}
+        self._suffix_deletes = {}
+
+    @classmethod
+    def from_pairs(cls, pairs, **kwargs):
+        """
+        Build from (synonym, canonical, rank[, is_misspelling]) rows; a lower rank is a stronger synonym.
+        """
+        resolver = cls(**kwargs)
+        canonical_ids = {}
+        ranked = {}
+        proper = set()
+        for seen, (synonym, canonical, rank, *flags) in enumerate(pairs):
+            canonical = normalize(canonical)
+            if not canonical:
+                continue
+            canonical_id = canonical_ids.setdefault(canonical, len(canonical_ids))
+            # A canonical name always resolves to itself first
+            ranked.setdefault(canonical, {})[canonical_id] = (-1, -1)
+            proper.add(canonical)
+            synonym = normalize(synonym)
+            if synonym:
+                candidates = ranked.setdefault(synonym, {})
+                candidates[canonical_id] = min(candidates.get(canonical_id, (rank, seen)), (rank, seen))
+                if not (flags and flags[0]):
+                    proper.add(synonym)
+
+        resolver.canonicals = sorted(canonical_ids, key=canonical_ids.get)
+        resolver.terms = sorted(ranked)
+        resolver.term_canonicals = [
+            tuple(sorted(ranked[term], key=ranked[term].get)) for term in resolver.terms
+        ]
+        resolver.misspelled = frozenset(i for i, term in enumerate(resolver.terms) if term not in proper)
+        resolver._build_indexes()
+        return resolver
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        """Build from synonym,canonical rows; row order within a canonical is its rank"""
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            rows = [row for row in csv.reader(f) if len(row) >= 2]
+        return cls.from_pairs(((synonym, canonical, 0) for synonym, canonical, *_ in rows), **kwargs)
+
+    @classmethod
+    def from_table(cls, db_connection_string, **kwargs):
+        """Build from the IngredientSynonyms table, ranked by LLMReportOrder and flagged by IsMisspelling"""
+        import pyodbc
+        conn = pyodbc.connect(db_connection_string)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT Synonym, Name, LLMReportOrder, IsMisspelling
+            FROM IngredientSynonyms
+            WHERE Synonym IS NOT NULL AND Name IS NOT NULL
+            """)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+        return cls.from_pairs(((row.Synonym, row.Name, row.LLMReportOrder, row.IsMisspelling) for row in rows),
+                              **kwargs)
+
+    def _build_indexes(self):
+        self._term_ids = {term: i for i, term in enumerate(self.terms)}
+        self._deletes = self._delete_index(lambda term: term[:self.prefix_length])
+        self._suffix_deletes = self._delete_index(lambda term: term[-self.prefix_length:])
+
+    def _delete_index(self, part):
+        deletes = {}
+        for term_id, term in enumerate(self.terms):
+            for deleted in _deletes(part(term), self.max_distance):
+                deletes.setdefault(deleted, []).append(term_id)
+        return {key: tuple(ids) for key, ids in deletes.items()}
+
+    def _candidates(self, index, part, max_distance):
+        candidates = set()
+        for deleted in _deletes(part, max_distance):
+            candidates.update(index.get(deleted, ()))
+        return candidates
+
+    def save(self, path):
+        """Write the resolver, indexes included, so load() needs no rebuild"""
+        state = {
+            'version': FORMAT_VERSION,
+            'max_distance': self.max_distance,
+            'prefix_length': self.prefix_length,
+            'canonicals': self.canonicals,
+            'terms': self.terms,
+            'term_canonicals': self.term_canonicals,
+            'misspelled': self.misspelled,
+            'deletes': self._deletes,
+            'suffix_deletes': self._suffix_deletes
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} was written by an incompatible resolver version; rebuild it")
+        resolver = cls(state['max_distance'], state['prefix_length'])
+        resolver.canonicals = state['canonicals']
+        resolver.terms = state['terms']
+        resolver.term_canonicals = state['term_canonicals']
+        resolver.misspelled = state['misspelled']
+        resolver._term_ids = {term: i for i, term in enumerate(resolver.terms)}
+        resolver._deletes = state['deletes']
+        resolver._suffix_deletes = state['suffix_deletes']
+        return resolver
+
+    def _canonicals_of(self, term_id):
+        return [self.canonicals[i] for i in self.term_canonicals[term_id]]
+
+    def is_misspelling(self, term):
+        """True if term is only known as a misspelling of its canonicals"""
+        term_id = self._term_ids.get(normalize(term))
+        return term_id is not None and term_id in self.misspelled
+
+    def _distance_for(self, query):
+        for length, distance in SHORT_QUERY_DISTANCES:
+            if len(query) <= length:
+                return min(distance, self.max_distance)
+        return self.max_distance
+
+    def lookup(self, text, max_distance=None, limit=5):
+        """
+        Matching terms as (term, distance, canonicals), closest first.
+
+        An exact hit is returned alone with distance 0; otherwise terms within
+        max_distance edits are returned (fewer for short queries), proper names
+        before misspellings at the same distance.
+        """
+        query = normalize(text)
+        term_id = self._term_ids.get(query)
+        if term_id is not None:
+            return [(query, 0, self._canonicals_of(term_id))]
+        allowed = self._distance_for(query)
+        max_distance = allowed if max_distance is None else min(max_distance, allowed)
+        if not query or not max_distance:
+            return []
+
+        # Terms sharing a start ("chicken ...") are many; requiring a close end as well
+        # leaves only a handful of candidates for the edit distance check
+        candidates = self._candidates(self._deletes, query[:self.prefix_length], max_distance)
+        if candidates:
+            candidates &= self._candidates(self._suffix_deletes, query[-self.prefix_length:], max_distance)
+        matches = []
+        for term_id in candidates:
+            distance = edit_distance(query, self.terms[term_id], max_distance)
+            if distance <= max_distance:
+                matches.append((distance, term_id in self.misspelled, abs(len(self.terms[term_id]) - len(query)),
+                                self.terms[term_id], term_id))
+        matches.sort()
+        return [(term, distance, self._canonicals_of(term_id)) for distance, _, _, term, term_id in matches[:limit]]
+
+    def resolve(self, text, max_distance=None):
+        """Best canonical ingredient for pantry input, or None"""
+        matches = self.lookup(text, max_distance, limit=1)
+        return matches[0][2][0] if matches else None
+
+    def complete(self, prefix, limit=10):
+        """Terms starting with prefix as (term, canonicals), for type-ahead"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and len(results) < limit and self.terms[i].startswith(prefix):
+            if i not in self.misspelled:
+                results.append((self.terms[i], self._canonicals_of(i)))
+            i += 1
+        return results
+
+
+def _typo(term, rng):
+    """One random edit (swap, drop, double or replace a letter), like a typing slip"""
+    if len(term) < 4:
+        return term + term[-1]
+    i = rng.randrange(1, len(term) - 1)
+    edit = rng.randrange(4)
+    if edit == 0:
+        return term[:i - 1] + term[i] + term[i - 1] + term[i + 1:]
+    if edit == 1:
+        return term[:i] + term[i + 1:]
+    if edit == 2:
+        return term[:i] + term[i] + term[i:]
+    return term[:i] + rng.choice('aeiourstln') + term[i + 1:]
+
+
+def benchmark(resolver, queries=20000, seed=42):
+    """Print lookups/sec and mean latency for exact, typo and prefix lookups"""
+    rng = random.Random(seed)
+    terms = [rng.choice(resolver.terms) for _ in range(queries)]
+    cases = [
+        ('exact', resolver.resolve, terms),
+        ('typo', resolver.resolve, [_typo(term, rng) for term in terms]),
+        ('prefix', resolver.complete, [term[:3] for term in terms])
+    ]
+    for name, method, inputs in cases:
+        started = time.perf_counter()
+        hits = sum(1 for text in inputs if method(text))
+        elapsed = time.perf_counter() - started
+        print(f"{name:>6}: {len(inputs) / elapsed:12,.0f} lookups/s  {elapsed / len(inputs) * 1e6:8.1f} us/lookup  "
+              f"{hits / len(inputs):.1%} resolved")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Resolve pantry items to canonical ingredients')
+    parser.add_argument('queries', nargs='*', help='Pantry items to resolve')
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help='Synonym CSV to build from')
+    parser.add_argument('--from_db', action='store_true', help='Build from the IngredientSynonyms table instead')
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help='Serialized resolver to load or write')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index even if the file exists')
+    parser.add_argument('--benchmark', action='store_true', help='Measure lookups per second')
+    return parser.parse_args()
+
+
+# Configuration
+DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=GroceryDB;Trusted_Connection=yes;"
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Sqlite', 'ingredient_synonyms.csv')
+DEFAULT_INDEX_PATH = "./synonym_resolver.idx"
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    started = time.perf_counter()
+    if os.path.exists(args.index) and not args.rebuild:
+        resolver = SynonymResolver.load(args.index)
+        print(f"Loaded {len(resolver.terms)} terms from {args.index} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    else:
+        resolver = SynonymResolver.from_table(DB_CONNECTION_STRING) if args.from_db else SynonymResolver.from_csv(args.csv)
+        resolver.save(args.index)
+        print(f"Built {len(resolver.terms)} terms for {len(resolver.canonicals)} ingredients "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms; saved to {args.index} "
+              f"({os.path.getsize(args.index) / 1024:.0f} KB)")
+
+    for query in args.queries:
+        matches = resolver.lookup(query)
+        print(f"{query!r}: " + ('; '.join(
+            f"{term} (d={distance}{', misspelling' if resolver.is_misspelling(term) else ''}) -> {', '.join(canonicals)}"
+            for term, distance, canonicals in matches) or 'no match'))
+    if args.benchmark:
+        benchmark(resolver)
@@ -90,4 +90,45 @@ CREATE TABLE RecipeUrlStatus (
 
 -- Create index for performance
 CREATE INDEX IX_RecipeUrlStatus_NextCheckDate ON RecipeUrlStatus(NextCheckDate)
-WHERE NextCheckDate IS NOT NULL;
\ No newline at end of file
+WHERE NextCheckDate IS NOT NULL;
+
+-- Pointer into the raw response archive (segment:offset:length); rawResponse is NULL for archived rows
+ALTER TABLE RawRecipeData ADD archiveRef VARCHAR(100) NULL;
+
+-- Recipe ID ranges leased to crawler processes (see workLeases.py)
+CREATE TABLE CrawlLease (
+    RangeStart INT NOT NULL PRIMARY KEY,
+    RangeEnd INT NOT NULL,
+    Status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending, leased, done
+    Owner NVARCHAR(100) NULL,
+    LeaseExpires DATETIME2 NULL,
+    LastHeartbeat DATETIME2 NULL,
+    CompletedAt DATETIME2 NULL,
+    RecipesSaved INT NULL
+);
+
+CREATE INDEX IX_CrawlLease_Status ON CrawlLease(Status, LeaseExpires);
+
+-- Child rows of a recipe are deleted by recipeId when the backfill rewrites it
+CREATE INDEX IX_RecipeIngredients_RecipeId ON RecipeIngredients(recipeId);
+
+-- New recipes are picked up by fetch time, since leased crawls fill ID ranges out of order
+CREATE INDEX IX_Recipes_FetchDateTime ON Recipes(fetchDateTime);
+
+-- Keyset pages of the URL validator (RetryCount = 0 / 1-2, RecipeId > last seen)
+CREATE INDEX IX_RecipeUrlStatus_Pending ON RecipeUrlStatus(RetryCount, RecipeId)
+INCLUDE (SourceUrl, IsAccessible, NextCheckDate)
+WHERE RetryCount < 3;
+
+-- Validators and redirect target for conditional revalidation of source URLs
+ALTER TABLE RecipeUrlStatus ADD
+    ETag NVARCHAR(200) NULL,
+    LastModified VARCHAR(50) NULL,
+    FinalUrl VARCHAR(1000) NULL;
+GO
+
+-- Keyset pages also read the validators, so cover them in the pending index
+CREATE INDEX IX_RecipeUrlStatus_Pending ON RecipeUrlStatus(RetryCount, RecipeId)
+INCLUDE (SourceUrl, IsAccessible, NextCheckDate, ETag, LastModified, FinalUrl)
+WHERE RetryCount < 3
+WITH (DROP_EXISTING = ON);
@@ -23,6 +23,9 @@ IF EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'Recipes')
 IF EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'RawRecipeData')
     DROP TABLE RawRecipeData;
 
+IF EXISTS (SELECT * FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = 'CrawlLease')
+    DROP TABLE CrawlLease;
+
 -- Re-enable foreign key constraints
 EXEC sp_MSforeachtable 'ALTER TABLE ? WITH CHECK CHECK CONSTRAINT ALL'
 
@@ -30,7 +33,8 @@ EXEC sp_MSforeachtable 'ALTER TABLE ? WITH CHECK CHECK CONSTRAINT ALL'
 CREATE TABLE RawRecipeData (
     recipeId INT PRIMARY KEY,
     rawResponse NVARCHAR(MAX),
-    fetchDateTime DATETIME2
+    fetchDateTime DATETIME2,
+    archiveRef VARCHAR(100) NULL
 );
 
 CREATE TABLE Recipes (
@@ -55,6 +59,8 @@ CREATE TABLE Recipes (
 	imageQuality INT NULL
 );
 
+CREATE INDEX IX_Recipes_FetchDateTime ON Recipes(fetchDateTime);
+
 CREATE TABLE RecipeIngredients (
     id INT IDENTITY(1,1) PRIMARY KEY,
     recipeId INT,
@@ -68,6 +74,8 @@ CREATE TABLE RecipeIngredients (
     FOREIGN KEY (recipeId) REFERENCES Recipes(id)
 );
 
+CREATE INDEX IX_RecipeIngredients_RecipeId ON RecipeIngredients(recipeId);
+
 CREATE TABLE Cuisines (
     id INT IDENTITY(1,1) PRIMARY KEY,
     name NVARCHAR(100) UNIQUE
@@ -103,6 +111,9 @@ CREATE TABLE RecipeUrlStatus (
     ErrorMessage NVARCHAR(500) NULL,
     RetryCount INT NOT NULL DEFAULT 0,
     NextCheckDate DATETIME2 NULL,
+    ETag NVARCHAR(200) NULL,
+    LastModified VARCHAR(50) NULL,
+    FinalUrl VARCHAR(1000) NULL,
     CONSTRAINT FK_RecipeUrlStatus_Recipes FOREIGN KEY (RecipeId) 
         REFERENCES Recipes(id) ON DELETE CASCADE
 );
@@ -111,4 +122,22 @@ CREATE TABLE RecipeUrlStatus (
 CREATE INDEX IX_RecipeUrlStatus_NextCheckDate ON RecipeUrlStatus(NextCheckDate)
 WHERE NextCheckDate IS NOT NULL;
 
+-- Keyset pages of the URL validator (RetryCount = 0 / 1-2, RecipeId > last seen)
+CREATE INDEX IX_RecipeUrlStatus_Pending ON RecipeUrlStatus(RetryCount, RecipeId)
+INCLUDE (SourceUrl, IsAccessible, NextCheckDate, ETag, LastModified, FinalUrl)
+WHERE RetryCount < 3;
+
+CREATE TABLE CrawlLease (
+    RangeStart INT NOT NULL PRIMARY KEY,
+    RangeEnd INT NOT NULL,
+    Status VARCHAR(10) NOT NULL DEFAULT 'pending',  -- pending, leased, done
+    Owner NVARCHAR(100) NULL,
+    LeaseExpires DATETIME2 NULL,
+    LastHeartbeat DATETIME2 NULL,
+    CompletedAt DATETIME2 NULL,
+    RecipesSaved INT NULL
+);
+
+CREATE INDEX IX_CrawlLease_Status ON CrawlLease(Status, LeaseExpires);
+
 PRINT 'Database has been completely reset and all tables recreated';
\ No newline at end of file
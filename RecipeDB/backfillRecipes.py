@@ -0,0 +1,187 @@
+# Offline re-parse of stored Spoonacular responses.
+# Streams RawRecipeData for an ID range, parses the records in a process pool and
+# bulk-rewrites Recipes and its child tables. No network access and no API quota needed.
+#
+# Command-line usage:
+# python backfillRecipes.py --start_id 1000 --end_id 2000 --processes 8 --archive_path ./raw_archive
+
+import argparse
+import os
+import time
+import pyodbc
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from rawArchive import RawRecipeArchive, load_raw_response
+from recipeWriter import RecipeBatchWriter, parse_recipe
+
+# Per-process archive handle, opened once by _init_worker
+_archive = None
+
+def _init_worker(archive_path):
+    global _archive
+    if archive_path:
+        _archive = RawRecipeArchive(archive_path)
+
+def parse_rows(rows):
+    """Parse (recipeId, rawResponse, archiveRef, fetchDateTime) rows; runs in a worker process"""
+    parsed = []
+    failed = []
+    for recipe_id, raw_response, archive_ref, fetch_time in rows:
+        try:
+            response = load_raw_response(raw_response, archive_ref, _archive)
+            if not response:
+                failed.append((recipe_id, 'Empty raw response'))
+                continue
+            parsed.append(parse_recipe(response, fetch_time=fetch_time))
+        except Exception as e:
+            failed.append((recipe_id, str(e)))
+    return parsed, failed
+
+
+class RecipeBackfill:
+    """
+    Rebuild Recipes, RecipeIngredients, RecipeCuisines and RecipeDishTypes from RawRecipeData.
+
+    A reader connection streams the raw rows in ID order with a forward-only cursor
+    (fetchmany, never fetchall), chunks are parsed in a process pool, and a
+    separate writer connection saves each parsed chunk in one transaction through
+    RecipeBatchWriter in replace mode.
+
+    Usage:
+        backfill = RecipeBackfill(DB_CONNECTION_STRING, archive_path="./raw_archive")
+        backfill.run(start_id=1000, end_id=2000)
+
+    Attributes:
+        db_connection_string (str): ODBC connection string for RecipeDB
+        archive_path (str): RawRecipeArchive directory, needed if rows use archiveRef
+        chunk_size (int): Raw rows per parse task and per write transaction (default 500)
+        processes (int): Parser processes (default: CPU count)
+    """
+    def __init__(self, db_connection_string, archive_path=None, chunk_size=500, processes=None):
+        self.db_connection_string = db_connection_string
+        self.archive_path = archive_path
+        self.chunk_size = chunk_size
+        self.processes = processes or os.cpu_count()
+
+    @staticmethod
+    def _range_filter(start_id, end_id):
+        where = ""
+        params = []
+        if start_id is not None:
+            where += " AND recipeId >= ?"
+            params.append(start_id)
+        if end_id is not None:
+            where += " AND recipeId <= ?"
+            params.append(end_id)
+        return where, params
+
+    def has_archive_column(self, conn):
+        """archiveRef only exists once the raw archive migration has been applied"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT COL_LENGTH('RawRecipeData', 'archiveRef')")
+            return cursor.fetchone()[0] is not None
+        finally:
+            cursor.close()
+
+    def count_archived_rows(self, conn, start_id=None, end_id=None):
+        where, params = self._range_filter(start_id, end_id)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM RawRecipeData WHERE archiveRef IS NOT NULL{where}", params)
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def stream_raw_rows(self, conn, start_id=None, end_id=None, archive_column=True):
+        """Yield lists of up to chunk_size raw rows as plain tuples"""
+        archive_column = "archiveRef" if archive_column else "NULL AS archiveRef"
+        where, params = self._range_filter(start_id, end_id)
+        query = f"SELECT recipeId, rawResponse, {archive_column}, fetchDateTime FROM RawRecipeData WHERE 1 = 1{where}"
+        query += " ORDER BY recipeId"
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    return
+                yield [tuple(row) for row in rows]
+        finally:
+            cursor.close()
+
+    def run(self, start_id=None, end_id=None):
+        print(f"Backfilling recipes (IDs {start_id or 'start'} to {end_id or 'end'}) with {self.processes} processes...")
+        started = time.perf_counter()
+        read_conn = pyodbc.connect(self.db_connection_string)
+        archive_column = self.has_archive_column(read_conn)
+        if archive_column and not self.archive_path:
+            # Without the archive these rows would all be reported as empty responses
+            archived = self.count_archived_rows(read_conn, start_id, end_id)
+            if archived:
+                read_conn.close()
+                raise ValueError(f"{archived} raw responses in this range are in the raw archive; "
+                                 f"pass --archive_path to backfill them")
+        write_conn = pyodbc.connect(self.db_connection_string)
+        writer = RecipeBatchWriter(write_conn, replace_existing=True)
+
+        total_saved = 0
+        total_failed = 0
+        try:
+            with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                     initargs=(self.archive_path,)) as executor:
+                pending = set()
+                chunks = self.stream_raw_rows(read_conn, start_id, end_id, archive_column)
+                exhausted = False
+                while pending or not exhausted:
+                    # Keep a bounded number of chunks in flight so memory stays flat
+                    while not exhausted and len(pending) < self.processes * 2:
+                        rows = next(chunks, None)
+                        if rows is None:
+                            exhausted = True
+                        else:
+                            pending.add(executor.submit(parse_rows, rows))
+                    if not pending:
+                        break
+
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        parsed, failed = future.result()
+                        for recipe_id, error in failed:
+                            print(f"Could not parse raw response for recipe {recipe_id}: {error}")
+                        for item in parsed:
+                            writer.add_parsed(item)
+                        saved = writer.flush()
+                        total_saved += len(saved)
+                        total_failed += len(failed) + len(parsed) - len(saved)
+
+                    elapsed = time.perf_counter() - started
+                    print(f"Rewrote {total_saved} recipes ({total_failed} failed, {total_saved / elapsed:.1f} recipes/sec)")
+        finally:
+            read_conn.close()
+            write_conn.close()
+
+        elapsed = time.perf_counter() - started
+        print(f"Completed backfill of {total_saved} recipes in {elapsed:.1f}s ({total_failed} failed).")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Re-parse stored raw recipe responses into the Recipes tables')
+    parser.add_argument('--start_id', type=int, help='Starting Recipe ID to process')
+    parser.add_argument('--end_id', type=int, help='Ending Recipe ID to process')
+    parser.add_argument('--chunk_size', type=int, default=500, help='Raw rows per parse task and transaction')
+    parser.add_argument('--processes', type=int, help='Parser processes (default: CPU count)')
+    parser.add_argument('--archive_path', help='Raw archive directory, if raw responses were archived')
+    return parser.parse_args()
+
+# Configuration
+DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=RecipeDB;Trusted_Connection=yes;"
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    RecipeBackfill(
+        DB_CONNECTION_STRING,
+        archive_path=args.archive_path,
+        chunk_size=args.chunk_size,
+        processes=args.processes
+    ).run(start_id=args.start_id, end_id=args.end_id)
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import threading
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency buckets, Prometheus style
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are interpolated within a bucket"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            'total': self.total
+        }
+
+
+class CrawlMetrics:
+    """
+    Thread-safe per-stage latency histograms and counters for a crawl run.
+
+    Stages are timed with the time() context manager, counters with increment().
+    At the end of a run write() saves a Prometheus textfile (*.prom) or a JSON
+    summary (anything else). start_progress() prints a snapshot line every few
+    seconds while the crawl runs.
+
+    Usage:
+        metrics = CrawlMetrics()
+        with metrics.time('fetch_recipe'):
+            ...
+        metrics.increment('recipes_saved', len(saved))
+        metrics.write("crawl_metrics.prom")
+
+    Attributes:
+        started (float): perf_counter value when the run started
+        histograms (dict): stage name -> LatencyHistogram
+        counters (dict): counter name -> int
+        rate_counter (str): Counter used for the recipes/sec figure
+    """
+    def __init__(self, rate_counter='recipes_saved'):
+        self.started = time.perf_counter()
+        self.histograms = {}
+        self.counters = {}
+        self.rate_counter = rate_counter
+        self._lock = threading.Lock()
+        self._progress_stop = None
+        self._progress_thread = None
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.histograms = {}
+            self.counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                'elapsed_seconds': elapsed,
+                'recipes_per_second': self.counters.get(self.rate_counter, 0) / elapsed if elapsed else 0.0,
+                'counters': dict(self.counters),
+                'stages': {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+            }
+
+    def format_progress(self):
+        snapshot = self.snapshot()
+        stages = ', '.join(
+            f"{stage} p50={summary['p50'] * 1000:.0f}ms p99={summary['p99'] * 1000:.0f}ms"
+            for stage, summary in snapshot['stages'].items() if summary['count']
+        )
+        return (f"[{snapshot['elapsed_seconds']:.0f}s] {snapshot['counters'].get(self.rate_counter, 0)} recipes "
+                f"({snapshot['recipes_per_second']:.2f}/s) {stages}")
+
+    def to_prometheus(self, prefix='recipe_crawler'):
+        """Render the Prometheus text exposition format for the node_exporter textfile collector"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds Latency of each crawler stage",
+            f"# TYPE {prefix}_stage_seconds histogram"
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.total}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        lines.append(f"# HELP {prefix}_events_total Crawler event counters")
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for counter, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{prefix}_events_total{{event="{counter}"}} {value}')
+        lines.append(f"# TYPE {prefix}_recipes_per_second gauge")
+        lines.append(f"{prefix}_recipes_per_second {snapshot['recipes_per_second']}")
+        lines.append(f"# TYPE {prefix}_elapsed_seconds gauge")
+        lines.append(f"{prefix}_elapsed_seconds {snapshot['elapsed_seconds']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write a .prom textfile or a JSON summary, atomically so scrapers never see half a file"""
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        # Per-thread temp name: the progress reporter and the final write may overlap
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def start_progress(self, interval, path=None):
+        """Print a snapshot every interval seconds (and refresh path, if given) until stop_progress()"""
+        self._progress_stop = threading.Event()
+
+        def report(stop):
+            while not stop.wait(interval):
+                print(self.format_progress())
+                if path:
+                    self.write(path)
+
+        self._progress_thread = threading.Thread(target=report, args=(self._progress_stop,), daemon=True)
+        self._progress_thread.start()
+
+    def stop_progress(self):
+        """Stop the reporter and wait for a write it may have in progress"""
+        if self._progress_stop is not None:
+            self._progress_stop.set()
+            self._progress_thread.join()
+            self._progress_stop = None
+            self._progress_thread = None
+
+
+def timed(stage):
+    """Method decorator that times calls into self.metrics under the given stage name"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.time(stage):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,386 @@
+# Reproducible throughput benchmark for SpoonacularCrawler.
+# Starts a local stand-in for the Spoonacular API (recipe payloads and images, with
+# configurable latency, errors and 429 bursts), points the crawler at it and at a
+# benchmark copy of RecipeDB, and reports recipes/sec, per-recipe latency and DB round
+# trips per recipe. The crawler's SQL is T-SQL, so the target is a local SQL Server
+# (LocalDB) database created from RecipeDB.sql rather than SQLite.
+#
+# Command-line usage:
+# python crawlerBenchmark.py --recipes 500 --latency_ms 80 --error_rate 0.02 --burst_every 200
+# python crawlerBenchmark.py --mode threads --max_workers 4 --archive_path ./raw_archive
+# python crawlerBenchmark.py --serve_only --port 8765
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import pyodbc
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rateLimiter import TokenBucketRateLimiter
+from rawArchive import RawRecipeArchive
+from spoonacular import SpoonacularCrawler
+
+RECIPE_PATH = re.compile(r'^/recipes/(\d+)/information')
+IMAGE_PATH = re.compile(r'^/images/(\d+)-556x370\.jpg')
+INGREDIENT_NAMES = ['salt', 'butter', 'garlic', 'onion', 'olive oil', 'flour', 'sugar', 'egg',
+                    'milk', 'chicken breast', 'tomato', 'basil', 'rice', 'lemon juice', 'pepper']
+CUISINES = ['Italian', 'Mexican', 'Thai', 'Indian', 'French', 'American']
+DISH_TYPES = ['lunch', 'main course', 'dinner', 'side dish', 'dessert', 'breakfast']
+
+
+class SpoonacularStandIn:
+    """
+    Local HTTP server that imitates /recipes/{id}/information and the image CDN.
+
+    Payloads come from a RawRecipeArchive (recorded responses) when one is given,
+    otherwise they are generated deterministically from the recipe id. Every
+    response can be delayed, a fraction fail with 500 or 404, and every
+    burst_every requests a run of burst_length requests gets 429 + Retry-After.
+    Quota headers are sent like the real API. Every placeholder_every-th recipe
+    shares the same placeholder image, as on the real CDN.
+
+    Usage:
+        stand_in = SpoonacularStandIn(latency_ms=50, error_rate=0.01)
+        stand_in.start()
+        crawler.base_url = stand_in.recipe_url_template
+        ...
+        stand_in.stop()
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=50, latency_jitter_ms=20, error_rate=0.0,
+                 not_found_rate=0.05, burst_every=0, burst_length=5, daily_quota=1_000_000,
+                 image_kb=40, placeholder_every=10, archive=None, seed=42):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.quota_left = daily_quota
+        self.image_kb = image_kb
+        self.placeholder_every = placeholder_every
+        self.archive = archive
+        self.seed = seed
+        self.requests_served = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._placeholder = random.Random(seed).randbytes(image_kb * 1024)
+        self._server = None
+
+    @property
+    def base(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    @property
+    def recipe_url_template(self):
+        return self.base + "/recipes/{recipe_id}/information?includeNutrition=false&apiKey={api_key}"
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stand_in.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Spoonacular stand-in listening on {self.base}")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _next_outcome(self):
+        """Decide the fate of one request; shared state is only touched under the lock"""
+        with self._lock:
+            self.requests_served += 1
+            delay = max(0.0, self._random.gauss(self.latency_ms, self.latency_jitter_ms)) / 1000
+            # The last burst_length requests of every burst_every-long cycle are throttled
+            if self.burst_every and (self.requests_served - 1) % self.burst_every >= self.burst_every - self.burst_length:
+                return delay, 429
+            if self.quota_left <= 0:
+                return delay, 402
+            roll = self._random.random()
+            if roll < self.error_rate:
+                return delay, 500
+            self.quota_left -= 1
+            return delay, 200
+
+    def handle(self, request):
+        delay, status = self._next_outcome()
+        time.sleep(delay)
+
+        recipe_match = RECIPE_PATH.match(request.path)
+        image_match = IMAGE_PATH.match(request.path)
+        headers = {'X-API-Quota-Request': '1', 'X-API-Quota-Left': str(self.quota_left)}
+        body = b''
+
+        if status == 429:
+            headers['Retry-After'] = '1'
+        elif recipe_match and status == 200:
+            recipe_id = int(recipe_match.group(1))
+            payload = self.payload(recipe_id)
+            if payload is None:
+                status = 404
+            else:
+                body = json.dumps(payload).encode('utf-8')
+                headers['Content-Type'] = 'application/json'
+        elif image_match and status == 200:
+            body = self.image(int(image_match.group(1)))
+            headers = {'Content-Type': 'image/jpeg'}
+        elif status == 200:
+            status = 404
+
+        request.send_response(status)
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def payload(self, recipe_id):
+        if self.archive is not None:
+            payload = self.archive.get(recipe_id)
+            if payload is not None:
+                payload = dict(payload)
+                payload['image'] = f"{self.base}/images/{recipe_id}-556x370.jpg"
+            return payload
+
+        rng = random.Random(self.seed * 1_000_003 + recipe_id)
+        if rng.random() < self.not_found_rate:
+            return None
+        return {
+            'id': recipe_id,
+            'image': f"{self.base}/images/{recipe_id}-556x370.jpg",
+            'title': f"Benchmark Recipe {recipe_id}",
+            'readyInMinutes': rng.randint(10, 120),
+            'servings': rng.randint(1, 8),
+            'sourceUrl': f"https://example.com/recipes/{recipe_id}",
+            'sourceName': 'Benchmark',
+            'vegetarian': rng.random() < 0.3,
+            'vegan': rng.random() < 0.1,
+            'preparationMinutes': rng.randint(5, 30),
+            'cookingMinutes': rng.randint(5, 90),
+            'glutenFree': rng.random() < 0.2,
+            'veryPopular': rng.random() < 0.05,
+            'aggregateLikes': rng.randint(0, 5000),
+            'instructions': ' '.join(f"Step {step}: stir well." for step in range(1, rng.randint(3, 12))),
+            'extendedIngredients': [
+                {
+                    'id': 1000 + index,
+                    'name': name,
+                    'nameClean': name,
+                    'original': f"{rng.randint(1, 4)} cups {name}",
+                    'originalName': name,
+                    'amount': rng.randint(1, 4),
+                    'unit': 'cups'
+                }
+                for index, name in enumerate(rng.sample(INGREDIENT_NAMES, rng.randint(5, 12)))
+            ],
+            'cuisines': rng.sample(CUISINES, rng.randint(0, 2)),
+            'dishTypes': rng.sample(DISH_TYPES, rng.randint(1, 3))
+        }
+
+    def image(self, recipe_id):
+        if self.placeholder_every and recipe_id % self.placeholder_every == 0:
+            return self._placeholder
+        return random.Random(recipe_id).randbytes(self.image_kb * 1024)
+
+
+class RoundTripCounter:
+    """Connection factory that counts statements, batches and commits sent to the server"""
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount=1):
+        with self._lock:
+            self.count += amount
+
+    def connect(self, *args, **kwargs):
+        return _CountingConnection(pyodbc.connect(*args, **kwargs), self)
+
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self):
+        return _CountingCursor(self._conn.cursor(), self._counter)
+
+    def commit(self):
+        self._counter.add()
+        self._conn.commit()
+
+    def rollback(self):
+        self._counter.add()
+        self._conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_counter', counter)
+
+    def execute(self, *args):
+        self._counter.add()
+        self._cursor.execute(*args)
+        return self
+
+    def executemany(self, sql, params):
+        params = list(params)
+        # fast_executemany ships the parameter array in one batch; otherwise one call per row
+        self._counter.add(1 if self._cursor.fast_executemany else len(params))
+        self._cursor.executemany(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+def reset_benchmark_db(db_connection_string, start_id):
+    """Delete everything the previous run wrote at or above start_id"""
+    conn = pyodbc.connect(db_connection_string)
+    cursor = conn.cursor()
+    for table, column in (('RecipeIngredients', 'recipeId'), ('RecipeCuisines', 'recipeId'),
+                          ('RecipeDishTypes', 'recipeId'), ('Recipes', 'id'), ('RawRecipeData', 'recipeId')):
+        cursor.execute(f"DELETE FROM {table} WHERE {column} >= ?", start_id)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def run_benchmark(args):
+    if 'DATABASE=RecipeDB;' in args.db.replace(' ', ''):
+        raise SystemExit("Refusing to benchmark against the production RecipeDB; pass --db for a benchmark database")
+
+    archive = RawRecipeArchive(args.archive_path) if args.archive_path else None
+    stand_in = SpoonacularStandIn(
+        latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms, error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate, burst_every=args.burst_every, burst_length=args.burst_length,
+        image_kb=args.image_kb, archive=archive, seed=args.seed
+    )
+    stand_in.start()
+    reset_benchmark_db(args.db, args.start_id)
+
+    counter = RoundTripCounter()
+    image_dir = tempfile.mkdtemp(prefix='crawler_bench_images_')
+    crawler = SpoonacularCrawler(
+        api_key='benchmark',
+        db_connection_string=args.db,
+        image_storage_path=image_dir,
+        max_workers=args.max_workers,
+        rate_limiter=TokenBucketRateLimiter(rate=args.rate, burst=args.rate, max_rate=args.rate * 4),
+        image_workers=args.image_workers,
+        db_connect=counter.connect
+    )
+    crawler.base_url = stand_in.recipe_url_template
+
+    try:
+        started = time.perf_counter()
+        if args.mode == 'async':
+            asyncio.run(crawler.crawl_recipes_async(start_id=args.start_id, number_to_crawl=args.recipes,
+                                                    max_in_flight=args.max_in_flight, batch_size=args.batch_size))
+        else:
+            crawler.crawl_recipes(start_id=args.start_id, number_to_crawl=args.recipes, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        crawler.close()
+        stand_in.stop()
+        if archive is not None:
+            archive.close()
+        shutil.rmtree(image_dir, ignore_errors=True)
+
+    snapshot = crawler.metrics.snapshot()
+    saved = snapshot['counters'].get('recipes_saved', 0)
+    recipe_latency = snapshot['stages'].get('recipe_total', {})
+    report = {
+        'mode': args.mode,
+        'recipes': saved,
+        'elapsed_seconds': elapsed,
+        'recipes_per_second': saved / elapsed if elapsed else 0.0,
+        'recipe_latency_p50_ms': (recipe_latency.get('p50') or 0) * 1000,
+        'recipe_latency_p99_ms': (recipe_latency.get('p99') or 0) * 1000,
+        'db_round_trips': counter.count,
+        'db_round_trips_per_recipe': counter.count / saved if saved else None,
+        'http_requests_served': stand_in.requests_served,
+        'counters': snapshot['counters'],
+        'stages': snapshot['stages']
+    }
+
+    print()
+    print(f"Mode:                 {args.mode}")
+    print(f"Recipes saved:        {saved} in {elapsed:.1f}s ({report['recipes_per_second']:.1f} recipes/sec)")
+    print(f"Per-recipe latency:   p50 {report['recipe_latency_p50_ms']:.0f} ms, p99 {report['recipe_latency_p99_ms']:.0f} ms")
+    if saved:
+        print(f"DB round trips:       {counter.count} ({report['db_round_trips_per_recipe']:.2f} per recipe)")
+    print(f"HTTP requests served: {stand_in.requests_served}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote benchmark report to {args.output}")
+    return report
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark SpoonacularCrawler against a local Spoonacular stand-in')
+    parser.add_argument('--db', default=BENCH_DB_CONNECTION_STRING, help='ODBC connection string of the benchmark database')
+    parser.add_argument('--mode', choices=['async', 'threads'], default='async', help='Crawl engine to benchmark')
+    parser.add_argument('--recipes', type=int, default=500, help='Recipes to crawl')
+    parser.add_argument('--start_id', type=int, default=1, help='First recipe ID')
+    parser.add_argument('--batch_size', type=int, default=100, help='Recipes per DB batch')
+    parser.add_argument('--max_in_flight', type=int, default=20, help='Concurrent fetches (async mode)')
+    parser.add_argument('--max_workers', type=int, default=4, help='Fetch threads (threads mode)')
+    parser.add_argument('--image_workers', type=int, default=8, help='Concurrent image downloads')
+    parser.add_argument('--rate', type=float, default=200.0, help='Starting requests/sec of the rate limiter')
+    parser.add_argument('--latency_ms', type=float, default=50, help='Mean stand-in response latency')
+    parser.add_argument('--latency_jitter_ms', type=float, default=20, help='Std deviation of the latency')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--not_found_rate', type=float, default=0.05, help='Fraction of generated IDs that 404')
+    parser.add_argument('--burst_every', type=int, default=0, help='Start a 429 burst every N requests (0 = never)')
+    parser.add_argument('--burst_length', type=int, default=5, help='Requests per 429 burst')
+    parser.add_argument('--image_kb', type=int, default=40, help='Size of served images')
+    parser.add_argument('--archive_path', help='Serve recorded payloads from this raw archive')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for latency, errors and generated payloads')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--serve_only', action='store_true', help='Only run the stand-in server')
+    parser.add_argument('--port', type=int, default=0, help='Stand-in port for --serve_only')
+    return parser.parse_args()
+
+# Configuration
+BENCH_DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=RecipeDB_Bench;Trusted_Connection=yes;"
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if args.serve_only:
+        archive = RawRecipeArchive(args.archive_path) if args.archive_path else None
+        stand_in = SpoonacularStandIn(port=args.port, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                                      burst_every=args.burst_every, burst_length=args.burst_length,
+                                      archive=archive, seed=args.seed)
+        stand_in.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stand_in.stop()
+    else:
+        run_benchmark(args)
@@ -0,0 +1,139 @@
+import time
+import socket
+import threading
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_dns_error(error):
+    """True if an HTTP client exception was caused by a failed host name lookup"""
+    # requests/urllib3 and aiohttp wrap the socket.gaierror in their own errors:
+    # follow the exception chain, urllib3's .reason, aiohttp's .os_error and exception args
+    stack = [error]
+    seen = set()
+    while stack:
+        error = stack.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        if isinstance(error, socket.gaierror):
+            return True
+        stack.extend((error.__cause__, error.__context__, getattr(error, 'reason', None),
+                      getattr(error, 'os_error', None)))
+        stack.extend(arg for arg in getattr(error, 'args', ()) if isinstance(arg, BaseException))
+    return False
+
+
+class DomainHealth:
+    """
+    Per-site circuit breaker plus a negative DNS filter for the URL validator.
+
+    After failure_threshold consecutive failures (no response or a 5xx) a site's
+    circuit opens and before_check() answers 'skip' without touching the
+    network, so the remaining URLs of a dead site are deferred in bulk. Once
+    cooldown_seconds have passed a single 'probe' check is let through: success
+    closes the circuit, failure re-opens it with a doubled cooldown (capped at
+    max_cooldown_seconds). Thread-safe, so the thread pool engine can share it.
+
+    The DNS part does no lookups of its own: the HTTP clients resolve hosts
+    (aiohttp caches positive answers with ttl_dns_cache), and a lookup failure
+    they report is remembered for dns_negative_ttl seconds, so the other URLs
+    of a dead host fail without another lookup.
+
+    Usage:
+        health = DomainHealth()
+        decision = health.before_check(domain)      # 'check', 'probe' or 'skip'
+        if decision != 'skip':
+            ok = ...check the URL...
+            health.record(domain, ok, probe=(decision == 'probe'))
+        # If the check is abandoned (cancelled, crashed) after a 'probe' decision:
+        health.abandon_probe(domain)
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open a circuit (default 5)
+        cooldown_seconds (float): Time before the first half-open probe (default 60)
+        max_cooldown_seconds (float): Upper bound for the doubled cooldown (default 3600)
+        dns_negative_ttl (float): Seconds a failed host lookup is remembered (default 60)
+    """
+    def __init__(self, failure_threshold=5, cooldown_seconds=60, max_cooldown_seconds=3600,
+                 dns_negative_ttl=60):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.dns_negative_ttl = dns_negative_ttl
+        self._domains = {}
+        self._dns = {}
+        self._lock = threading.Lock()
+
+    def _state(self, domain):
+        state = self._domains.get(domain)
+        if state is None:
+            state = self._domains[domain] = {
+                'state': CLOSED, 'failures': 0, 'opened_at': 0.0,
+                'cooldown': self.cooldown_seconds, 'probing': False
+            }
+        return state
+
+    def before_check(self, domain):
+        """Decide whether a URL of this site is checked ('check'/'probe') or deferred ('skip')"""
+        with self._lock:
+            state = self._state(domain)
+            if state['state'] == CLOSED:
+                return 'check'
+            if state['probing']:
+                return 'skip'
+            if time.monotonic() - state['opened_at'] < state['cooldown']:
+                return 'skip'
+            state['state'] = HALF_OPEN
+            state['probing'] = True
+            return 'probe'
+
+    def record(self, domain, ok, probe=False):
+        """Record the outcome of a check; ok means the site answered with a non-5xx status"""
+        with self._lock:
+            state = self._state(domain)
+            if probe:
+                state['probing'] = False
+            if ok:
+                if state['state'] != CLOSED:
+                    print(f"Circuit closed for {domain}")
+                state.update(state=CLOSED, failures=0, cooldown=self.cooldown_seconds)
+                return
+
+            state['failures'] += 1
+            if probe:
+                # Still down: wait twice as long before the next probe
+                state['cooldown'] = min(state['cooldown'] * 2, self.max_cooldown_seconds)
+                state.update(state=OPEN, opened_at=time.monotonic())
+            elif state['state'] == CLOSED and state['failures'] >= self.failure_threshold:
+                print(f"Circuit opened for {domain} after {state['failures']} consecutive failures")
+                state.update(state=OPEN, opened_at=time.monotonic())
+
+    def abandon_probe(self, domain):
+        """Forget a probe that never recorded an outcome, so the next check can probe again"""
+        with self._lock:
+            state = self._domains.get(domain)
+            if state is not None:
+                state['probing'] = False
+
+    def is_open(self, domain):
+        with self._lock:
+            state = self._domains.get(domain)
+            return state is not None and state['state'] != CLOSED
+
+    def unresolvable(self, host):
+        """True if a lookup of host failed within the last dns_negative_ttl seconds"""
+        with self._lock:
+            expires = self._dns.get(host)
+            if expires is None:
+                return False
+            if expires > time.monotonic():
+                return True
+            del self._dns[host]
+            return False
+
+    def record_dns_failure(self, host):
+        with self._lock:
+            self._dns[host] = time.monotonic() + self.dns_negative_ttl
@@ -0,0 +1,102 @@
+from array import array
+from bisect import bisect_right
+
+
+class IdRangeSet:
+    """
+    Compact set of integer IDs stored as sorted, non-touching inclusive runs.
+
+    Crawled recipe IDs come in long contiguous runs, so a few thousand runs stand
+    in for millions of IDs. Runs are loaded with a gaps-and-islands aggregate
+    query (one row per run, not per ID), and next_gap() jumps straight over a
+    run instead of testing IDs one by one.
+
+    Usage:
+        processed = IdRangeSet.load(cursor, "RawRecipeData", "recipeId")
+        next_id = processed.next_gap(start_id)
+        processed.add(next_id)
+
+    Attributes:
+        starts (array): First ID of each run
+        ends (array): Last ID of each run
+    """
+    def __init__(self, runs=()):
+        self.starts = array('q')
+        self.ends = array('q')
+        self._count = 0
+        for start, end in runs:
+            self.starts.append(start)
+            self.ends.append(end)
+            self._count += end - start + 1
+
+    @classmethod
+    def load(cls, cursor, table, column, start=None, end=None):
+        """Build the set from the contiguous runs of column in table, optionally only for start..end"""
+        where = []
+        params = []
+        if start is not None:
+            where.append(f"{column} >= ?")
+            params.append(start)
+        if end is not None:
+            where.append(f"{column} <= ?")
+            params.append(end)
+        cursor.execute(f"""
+            SELECT MIN({column}), MAX({column})
+            FROM (
+                SELECT {column}, {column} - ROW_NUMBER() OVER (ORDER BY {column}) AS grp
+                FROM {table}
+                {'WHERE ' + ' AND '.join(where) if where else ''}
+            ) AS numbered
+            GROUP BY grp
+            ORDER BY MIN({column})
+        """, params)
+        return cls((start, end) for start, end in cursor.fetchall())
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, value):
+        i = bisect_right(self.starts, value) - 1
+        return i >= 0 and value <= self.ends[i]
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield from range(start, end + 1)
+
+    def runs(self):
+        return list(zip(self.starts, self.ends))
+
+    def add(self, value):
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return
+        joins_left = i >= 0 and self.ends[i] == value - 1
+        joins_right = i + 1 < len(self.starts) and self.starts[i + 1] == value + 1
+        if joins_left and joins_right:
+            self.ends[i] = self.ends[i + 1]
+            del self.starts[i + 1]
+            del self.ends[i + 1]
+        elif joins_left:
+            self.ends[i] = value
+        elif joins_right:
+            self.starts[i + 1] = value
+        else:
+            self.starts.insert(i + 1, value)
+            self.ends.insert(i + 1, value)
+        self._count += 1
+
+    def next_gap(self, value):
+        """Smallest ID >= value that is not in the set"""
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            # Runs never touch, so the ID after a run is always free
+            return self.ends[i] + 1
+        return value
+
+    def iter_gaps(self, start):
+        """Yield IDs >= start that are not in the set, forever; sees IDs added meanwhile"""
+        value = start
+        while True:
+            value = self.next_gap(value)
+            yield value
+            value += 1
@@ -0,0 +1,300 @@
+# Queue-driven download stage for recipe images.
+# The crawler hands saved recipes to ImageDownloader instead of downloading inline, so a
+# slow image CDN no longer stalls recipe ingestion. Run this script directly to download
+# every recipe image that is still missing (imageDownloaded = 0).
+
+import os
+import queue
+import shutil
+import hashlib
+import threading
+import time
+import requests
+import pyodbc
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from crawlMetrics import CrawlMetrics, timed
+
+_STOP = object()
+
+
+class ImageDownloader:
+    """
+    Download recipe images on a pool of worker threads, separate from the recipe crawl.
+
+    Images are streamed to "<recipe_id>.<ext>.part" and renamed when complete; an
+    interrupted download resumes with an HTTP Range request. Files are hashed
+    while streaming and identical images (e.g. the shared placeholder) are stored
+    once and hard-linked under each recipe's file name. A single flusher thread
+    owns the DB connection and writes imageDownloaded/imageFileType in bulk.
+
+    Usage:
+        downloader = ImageDownloader(DB_CONNECTION_STRING, "./recipe_images")
+        with downloader:                # start() ... close(), which waits for the queue to drain
+            downloader.submit(recipe_id, image_url)
+
+    Attributes:
+        db_connection_string (str): ODBC connection string for RecipeDB
+        image_storage_path (str): Directory the images are written to
+        max_workers (int): Concurrent image downloads (default 8)
+        request_timeout (int): HTTP timeout in seconds (default 30)
+        chunk_size (int): Streaming chunk size in bytes (default 64 KB)
+        flush_every (int): Status updates per bulk write (default 200)
+        flush_interval (float): Seconds before a partial bulk write is forced (default 5)
+        metrics (CrawlMetrics): Receives download_image latency and image counters
+        db_connect: Connection factory, pyodbc.connect unless a benchmark wraps it
+        downloaded (int): Images stored so far
+        deduplicated (int): Images that matched an already stored file
+        failed (int): Images that could not be downloaded
+        deferred (int): Images not queued because the queue was full; they keep
+            imageDownloaded = 0 and are picked up by enqueue_pending() later
+    """
+    def __init__(self, db_connection_string, image_storage_path, max_workers=8, request_timeout=30,
+                 chunk_size=64 * 1024, flush_every=200, flush_interval=5.0, metrics=None,
+                 db_connect=pyodbc.connect):
+        self.db_connection_string = db_connection_string
+        self.image_storage_path = image_storage_path
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.chunk_size = chunk_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.metrics = metrics or CrawlMetrics()
+        self.db_connect = db_connect
+        os.makedirs(self.image_storage_path, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.deferred = 0
+        self._jobs = queue.Queue(maxsize=max_workers * 50)
+        self._results = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._hash_index_path = os.path.join(self.image_storage_path, 'image_hashes.tsv')
+        self._hash_index = self._load_hash_index()
+
+    def _load_hash_index(self):
+        """Load sha256 -> stored file name for images already on disk"""
+        index = {}
+        if os.path.exists(self._hash_index_path):
+            with open(self._hash_index_path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) == 2:
+                        index[parts[0]] = parts[1]
+        return index
+
+    def start(self):
+        for _ in range(self.max_workers):
+            thread = threading.Thread(target=self._download_worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._flusher = threading.Thread(target=self._flush_worker, daemon=True)
+        self._flusher.start()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, recipe_id, image_url):
+        """Queue an image without blocking the caller; returns False if the queue is full"""
+        if not image_url:
+            return False
+        try:
+            self._jobs.put_nowait((recipe_id, image_url))
+            return True
+        except queue.Full:
+            # The crawl must not wait for a slow CDN; the image stays pending in the DB
+            with self._lock:
+                self.deferred += 1
+            self.metrics.increment('images_deferred')
+            return False
+
+    def enqueue_pending(self, start_id=None, end_id=None):
+        """Queue every recipe whose image has not been downloaded yet"""
+        conn = self.db_connect(self.db_connection_string)
+        cursor = conn.cursor()
+        query = """
+            SELECT id, image FROM Recipes
+            WHERE image IS NOT NULL AND (imageDownloaded = 0 OR imageDownloaded IS NULL)
+            """
+        params = []
+        if start_id is not None:
+            query += " AND id >= ?"
+            params.append(start_id)
+        if end_id is not None:
+            query += " AND id <= ?"
+            params.append(end_id)
+        cursor.execute(query + " ORDER BY id", params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        print(f"Found {len(rows)} recipe images to download")
+        for row in rows:
+            # Nothing else is waiting here, so wait for room instead of deferring
+            self._jobs.put((row.id, row.image))
+
+    def close(self):
+        """Wait for queued images, write the remaining updates and stop the stage"""
+        for _ in self._threads:
+            self._jobs.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._results.put(_STOP)
+        if self._threads:
+            self._flusher.join()
+        self._threads = []
+        print(f"Images: {self.downloaded} downloaded ({self.deduplicated} duplicates linked), {self.failed} failed")
+        if self.deferred:
+            print(f"{self.deferred} images were deferred; run imageDownloader.py to fetch them")
+
+    def _download_worker(self):
+        while True:
+            job = self._jobs.get()
+            if job is _STOP:
+                return
+            recipe_id, image_url = job
+            try:
+                file_ext = self.download(recipe_id, image_url)
+            except Exception as e:
+                # Keep the worker alive; close() needs every worker to reach _STOP
+                print(f"Unexpected error downloading image for recipe {recipe_id}: {str(e)}")
+                file_ext = None
+            if file_ext:
+                self._results.put((file_ext, recipe_id))
+            else:
+                with self._lock:
+                    self.failed += 1
+                self.metrics.increment('images_failed')
+                print(f"Failed to download image for recipe {recipe_id}")
+
+    def _flush_worker(self):
+        """Owns the DB connection; writes status updates in bulk"""
+        conn = self.db_connect(self.db_connection_string)
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        pending = []
+        last_flush = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self._results.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+                if item is not None and item is not _STOP:
+                    pending.append(item)
+
+                due = time.monotonic() - last_flush >= self.flush_interval
+                if pending and (len(pending) >= self.flush_every or due or item is _STOP):
+                    self._write_updates(conn, cursor, pending)
+                    pending = []
+                    last_flush = time.monotonic()
+                if item is _STOP:
+                    return
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _write_updates(self, conn, cursor, rows):
+        try:
+            cursor.executemany("""
+                UPDATE Recipes
+                SET imageDownloaded = 1, imageFileType = ?
+                WHERE id = ?
+            """, rows)
+            conn.commit()
+        except pyodbc.Error as e:
+            print(f"Error saving image status for {len(rows)} recipes: {str(e)}")
+            conn.rollback()
+
+    @timed('download_image')
+    def download(self, recipe_id, image_url):
+        """Download one image (resuming a partial file) and return its file type, or None"""
+        parsed = urlparse(image_url)
+        file_ext = os.path.splitext(parsed.path)[1].lower().lstrip('.')
+        if not file_ext:
+            return None
+
+        filename = f"{recipe_id}.{file_ext}"
+        filepath = os.path.join(self.image_storage_path, filename)
+        part_path = filepath + '.part'
+
+        try:
+            digest = hashlib.sha256()
+            existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {'Range': f'bytes={existing}-'} if existing else {}
+
+            with self.session.get(image_url, stream=True, timeout=self.request_timeout, headers=headers) as response:
+                if response.status_code == 416 and existing:
+                    # The partial file already holds the whole image
+                    mode = None
+                elif response.status_code == 206 and existing:
+                    mode = 'ab'
+                elif response.status_code == 200:
+                    mode = 'wb'
+                else:
+                    return None
+
+                if mode != 'wb' and existing:
+                    with open(part_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                            digest.update(chunk)
+                if mode:
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(self.chunk_size):
+                            f.write(chunk)
+                            digest.update(chunk)
+
+            self._store(part_path, filepath, filename, digest.hexdigest())
+            return file_ext
+
+        except (requests.RequestException, OSError) as e:
+            print(f"Error downloading image for recipe {recipe_id}: {str(e)}")
+            return None
+
+    def _store(self, part_path, filepath, filename, sha):
+        """Move a finished download into place, linking to an identical stored image if there is one"""
+        with self._lock:
+            original = self._hash_index.get(sha)
+            original_path = os.path.join(self.image_storage_path, original) if original else None
+            if original_path and original != filename and os.path.exists(original_path):
+                os.remove(part_path)
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                try:
+                    os.link(original_path, filepath)
+                except OSError:
+                    shutil.copyfile(original_path, filepath)
+                self.deduplicated += 1
+                self.metrics.increment('images_deduplicated')
+            else:
+                os.replace(part_path, filepath)
+                if original != filename:
+                    self._hash_index[sha] = filename
+                    with open(self._hash_index_path, 'a', encoding='utf-8') as f:
+                        f.write(f"{sha}\t{filename}\n")
+            self.downloaded += 1
+            self.metrics.increment('images_downloaded')
+
+
+# Configuration
+DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=RecipeDB;Trusted_Connection=yes;"
+IMAGE_STORAGE_PATH = "./recipe_images"  # Directory to store downloaded images
+
+if __name__ == "__main__":
+    downloader = ImageDownloader(DB_CONNECTION_STRING, IMAGE_STORAGE_PATH)
+    downloader.start()
+    try:
+        downloader.enqueue_pending()
+    finally:
+        downloader.close()
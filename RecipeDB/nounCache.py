@@ -0,0 +1,230 @@
+import re
+import time
+import sqlite3
+from collections import OrderedDict, Counter, defaultdict
+
+
+def normalize_name(text):
+    """Cache key for an ingredient name: lower-cased with whitespace collapsed"""
+    return ' '.join(str(text).lower().split())
+
+
+class NounCache:
+    """
+    Memoized noun lemmas per normalized ingredient name: an in-process LRU in front of SQLite.
+
+    Entries are keyed by the model version (e.g. "en_core_web_sm-3.7.1/spacy-3.7.2"),
+    so upgrading spaCy or the model starts a fresh cache instead of returning
+    stale lemmas. The stored value is the space-separated noun lemmas, or an
+    empty string when the name has no nouns.
+
+    Usage:
+        cache = NounCache("./noun_cache.sqlite", model_version)
+        found = cache.get_many(["salt", "olive oil"])   # {name: nouns} for hits only
+        cache.put_many({"brown sugar": "sugar"})
+        cache.close()
+
+    Attributes:
+        path (str): SQLite file holding the persistent cache
+        model_version (str): Version key the entries belong to
+        max_memory (int): Names kept in the in-process LRU (default 100000)
+        hits (int): Lookups answered from memory or disk
+        misses (int): Lookups that needed the NLP pipeline
+    """
+    def __init__(self, path, model_version, max_memory=100000):
+        self.path = path
+        self.model_version = model_version
+        self.max_memory = max_memory
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS nouns (
+                model TEXT NOT NULL,
+                name TEXT NOT NULL,
+                nouns TEXT NOT NULL,
+                PRIMARY KEY (model, name)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def _remember(self, name, nouns):
+        self._memory[name] = nouns
+        self._memory.move_to_end(name)
+        if len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get(self, name):
+        return self.get_many([name]).get(name)
+
+    def get_many(self, names):
+        """Look up normalized names; returns {name: nouns} for the ones already cached"""
+        found = {}
+        missing = []
+        unique = list(dict.fromkeys(names))
+        for name in unique:
+            nouns = self._memory.get(name)
+            if nouns is None:
+                missing.append(name)
+            else:
+                self._memory.move_to_end(name)
+                found[name] = nouns
+
+        # SQLite allows 999 parameters per statement in older builds
+        for i in range(0, len(missing), 900):
+            chunk = missing[i:i + 900]
+            rows = self.conn.execute(
+                f"SELECT name, nouns FROM nouns WHERE model = ? AND name IN ({', '.join('?' * len(chunk))})",
+                [self.model_version, *chunk]
+            )
+            for name, nouns in rows:
+                self._remember(name, nouns)
+                found[name] = nouns
+
+        self.hits += len(found)
+        self.misses += len(unique) - len(found)
+        return found
+
+    def put(self, name, nouns):
+        self.put_many({name: nouns})
+
+    def put_many(self, entries):
+        for name, nouns in entries.items():
+            self._remember(name, nouns)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO nouns (model, name, nouns) VALUES (?, ?, ?)",
+            [(self.model_version, name, nouns) for name, nouns in entries.items()]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# Names made only of lower-case words split by single spaces tokenize exactly as split() in spaCy
+SIMPLE_NAME = re.compile(r'[a-z]+(?: [a-z]+)*')
+
+
+class TokenLexicon:
+    """
+    Token -> (POS, lemma) table learned from spaCy output, used to resolve names without the tagger.
+
+    Every parsed name adds its tokens, keyed by token text and by whether the
+    token is the last word of the name (ingredient heads are nearly always
+    last). A key is trusted only when spaCy tagged it the same way every time
+    and at least min_count times, so context-dependent words ("ground",
+    "cream") keep going to spaCy. resolve() answers for names whose tokens are
+    all trusted and returns their noun lemmas, or None to fall back to spaCy.
+
+    Usage:
+        lexicon = TokenLexicon("./noun_cache.sqlite", model_version)
+        noun_lemmas = lexicon.resolve("red onion")     # None -> parse with spaCy
+        lexicon.observe(doc)                           # after parsing
+        lexicon.save()
+
+    Attributes:
+        path (str): SQLite file holding the token counts (the noun cache file)
+        model_version (str): Version key the counts belong to
+        min_count (int): Consistent observations needed before a token is trusted (default 2)
+        hits (int): Names resolved by lookup
+        misses (int): Names that needed spaCy
+        fast_seconds (float): Time spent in resolve()
+        nlp_seconds (float): Time the caller spent parsing the misses (for the speedup report)
+    """
+    def __init__(self, path, model_version, min_count=2):
+        self.path = path
+        self.model_version = model_version
+        self.min_count = min_count
+        self.hits = 0
+        self.misses = 0
+        self.fast_seconds = 0.0
+        self.nlp_seconds = 0.0
+        self._counts = defaultdict(Counter)
+        self._pending = Counter()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                model TEXT NOT NULL,
+                token TEXT NOT NULL,
+                last INTEGER NOT NULL,
+                pos TEXT NOT NULL,
+                lemma TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (model, token, last, pos, lemma)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        rows = self.conn.execute(
+            "SELECT token, last, pos, lemma, count FROM tokens WHERE model = ?", (model_version,)
+        )
+        for token, last, pos, lemma, count in rows:
+            self._counts[(token, bool(last))][(pos, lemma)] = count
+
+    def __len__(self):
+        return len(self._counts)
+
+    def observe(self, doc):
+        """Record the tags spaCy gave each token of a parsed name"""
+        for i, token in enumerate(doc):
+            key = (token.text, i == len(doc) - 1)
+            tag = (token.pos_, token.lemma_)
+            self._counts[key][tag] += 1
+            self._pending[(key, tag)] += 1
+
+    def lookup(self, token, last):
+        tags = self._counts.get((token, last))
+        if not tags or len(tags) != 1:
+            return None
+        tag, count = next(iter(tags.items()))
+        return tag if count >= self.min_count else None
+
+    def resolve(self, name):
+        """Noun lemmas of a normalized name if every token is known, else None"""
+        started = time.perf_counter()
+        try:
+            if not SIMPLE_NAME.fullmatch(name):
+                self.misses += 1
+                return None
+            tokens = name.split()
+            nouns = []
+            for i, token in enumerate(tokens):
+                tag = self.lookup(token, i == len(tokens) - 1)
+                if tag is None:
+                    self.misses += 1
+                    return None
+                if tag[0] == 'NOUN':
+                    nouns.append(tag[1])
+            self.hits += 1
+            return ' '.join(nouns)
+        finally:
+            self.fast_seconds += time.perf_counter() - started
+
+    def report(self):
+        total = self.hits + self.misses
+        if not total:
+            return "Token lexicon: no lookups"
+        line = f"Token lexicon: {self.hits}/{total} names resolved without spaCy ({self.hits / total:.1%})"
+        if self.hits and self.misses and self.nlp_seconds:
+            fast = self.fast_seconds / total
+            slow = self.nlp_seconds / self.misses
+            line += f", {fast * 1e6:.1f} us vs {slow * 1e6:.0f} us per name via spaCy ({slow / fast:.0f}x)"
+        return line
+
+    def save(self):
+        """Add the counts observed since the last save to the SQLite table"""
+        if not self._pending:
+            return
+        self.conn.executemany("""
+            INSERT INTO tokens (model, token, last, pos, lemma, count) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (model, token, last, pos, lemma) DO UPDATE SET count = count + excluded.count
+        """, [
+            (self.model_version, token, int(last), pos, lemma, count)
+            for ((token, last), (pos, lemma)), count in self._pending.items()
+        ])
+        self.conn.commit()
+        self._pending = Counter()
+
+    def close(self):
+        self.save()
+        self.conn.close()
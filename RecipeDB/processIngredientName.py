@@ -3,13 +3,52 @@
 # It extracts nouns from the ingredient names and stores the results in IngredientName table.
 # It uses SQLAlchemy for database interaction and handles incremental updates to avoid reprocessing.
 
-import spacy
-from sqlalchemy import create_engine, MetaData, Table, select, text
+import os
+import time
+from itertools import islice
+from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
+from nounCache import NounCache, TokenLexicon, normalize_name
 
-# Initialize NLP processor
-print("Loading spaCy language model...")
-nlp = spacy.load("en_core_web_sm")
+# spaCy and the model are loaded on first use, so a run with nothing to do starts instantly
+MODEL_NAME = "en_core_web_sm"
+_nlp = None
+
+def get_nlp():
+    """Load the NLP processor; only POS tags and lemmas are used, so the parser and NER are not loaded"""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        print("Loading spaCy language model...")
+        _nlp = spacy.load(MODEL_NAME, exclude=["parser", "ner"])
+    return _nlp
+
+# Batch extraction settings for nlp.pipe
+NLP_BATCH_SIZE = 1000
+NLP_PROCESSES = os.cpu_count() or 1
+
+# Persistent cache of noun lemmas per normalized name, shared by repeated and incremental runs.
+# The same file holds the token lexicon used to skip spaCy for names made of known words.
+NOUN_CACHE_PATH = "./noun_cache.sqlite"
+_noun_cache = None
+_token_lexicon = None
+
+def _model_version():
+    import spacy
+    # Read from package metadata so cache hits never need the model itself
+    return f"{MODEL_NAME}-{spacy.util.get_package_version(MODEL_NAME)}/spacy-{spacy.__version__}"
+
+def get_noun_cache():
+    global _noun_cache
+    if _noun_cache is None:
+        _noun_cache = NounCache(NOUN_CACHE_PATH, _model_version())
+    return _noun_cache
+
+def get_token_lexicon():
+    global _token_lexicon
+    if _token_lexicon is None:
+        _token_lexicon = TokenLexicon(NOUN_CACHE_PATH, _model_version())
+    return _token_lexicon
 
 # MSSQL Database configuration with Integrated Security
 DB_CONFIG = {
@@ -31,103 +70,199 @@ def get_db_engine():
     # connection_string = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=GroceryDB;Trusted_Connection=yes;"
     return create_engine(connection_string)
 
-def extract_nouns(text):
-    """Extract nouns from text using spaCy"""
-    if not text or str(text).strip() == '':
-        return None, None
-        
-    doc = nlp(str(text).lower())
-    nouns = [token.lemma_ for token in doc if token.pos_ == 'NOUN']
+def _noun_lemmas(doc):
+    return ' '.join(token.lemma_ for token in doc if token.pos_ == 'NOUN')
+
+def _nouns_result(noun_lemmas, text):
+    nouns = noun_lemmas.split()
     
     last_noun = nouns[-1] if nouns else text
     all_nouns = ' '.join(nouns) if nouns else text
     
     return last_noun, all_nouns
 
-def get_unprocessed_ingredients(engine):
-    """Retrieve only ingredients that haven't been processed yet"""
-    metadata = MetaData()
-    
-    ingredients = Table(
-        DB_CONFIG['ingredients_table'],
-        metadata,
-        autoload_with=engine,
-        schema=DB_CONFIG['schema']
-    )
-    
-    processed = Table(
-        DB_CONFIG['results_table'],
-        metadata,
-        autoload_with=engine,
-        schema=DB_CONFIG['schema']
-    )
-    
-    query = select(
-        ingredients.c.IngredientId,
-        ingredients.c.Name
-    ).select_from(
-        ingredients.outerjoin(
-            processed,
-            ingredients.c.IngredientId == processed.c.IngredientId
+def extract_nouns(text):
+    """Extract nouns from text using spaCy"""
+    if not text or str(text).strip() == '':
+        return None, None
+        
+    cache = get_noun_cache()
+    name = normalize_name(text)
+    noun_lemmas = cache.get(name)
+    if noun_lemmas is None:
+        lexicon = get_token_lexicon()
+        noun_lemmas = lexicon.resolve(name)
+        if noun_lemmas is None:
+            started = time.perf_counter()
+            doc = get_nlp()(name)
+            lexicon.observe(doc)
+            noun_lemmas = _noun_lemmas(doc)
+            lexicon.nlp_seconds += time.perf_counter() - started
+            lexicon.save()
+        cache.put(name, noun_lemmas)
+    return _nouns_result(noun_lemmas, text)
+
+def extract_nouns_batch(texts, batch_size=NLP_BATCH_SIZE, n_process=1):
+    """
+    Same results as extract_nouns for many texts, in order, using nlp.pipe.
+
+    Each distinct normalized name is parsed at most once; names already in the
+    noun cache skip NLP entirely, names made of known words are resolved by the
+    token lexicon, and the rest are spread over n_process worker processes.
+    New results are added to the cache and the lexicon. If spaCy fails on a
+    chunk, that chunk is parsed name by name; a name that still fails is
+    logged, not cached, and returned as its own text, as a failed extract_nouns
+    call used to be.
+    """
+    texts = list(texts)
+    names = [normalize_name(text) if text and str(text).strip() else None for text in texts]
+    cache = get_noun_cache()
+    known = cache.get_many([name for name in names if name])
+    unseen = [name for name in dict.fromkeys(names) if name and name not in known]
+    if unseen:
+        lexicon = get_token_lexicon()
+        resolved = {}
+        to_parse = []
+        for name in unseen:
+            noun_lemmas = lexicon.resolve(name)
+            if noun_lemmas is None:
+                to_parse.append(name)
+            else:
+                resolved[name] = noun_lemmas
+
+        if to_parse:
+            if n_process > 1 and len(to_parse) < batch_size * n_process:
+                n_process = 1  # Not worth starting worker processes
+            started = time.perf_counter()
+            remaining = to_parse
+            while remaining:
+                parsed = 0
+                try:
+                    for name, doc in zip(remaining, get_nlp().pipe(remaining, batch_size=batch_size,
+                                                                   n_process=n_process)):
+                        lexicon.observe(doc)
+                        resolved[name] = _noun_lemmas(doc)
+                        parsed += 1
+                    remaining = []
+                except Exception as e:
+                    # Docs come back in order, so the failing name is in the next batch_size names
+                    print(f"spaCy failed near {remaining[parsed]!r} ({str(e)}); parsing that chunk name by name")
+                    chunk, remaining = remaining[parsed:parsed + batch_size], remaining[parsed + batch_size:]
+                    for name in chunk:
+                        try:
+                            doc = get_nlp()(name)
+                        except Exception as e:
+                            print(f"Skipping {name!r}: {str(e)}")
+                            continue
+                        lexicon.observe(doc)
+                        resolved[name] = _noun_lemmas(doc)
+            lexicon.nlp_seconds += time.perf_counter() - started
+            lexicon.save()
+
+        cache.put_many(resolved)
+        known.update(resolved)
+
+    for text, name in zip(texts, names):
+        if name is None:
+            yield None, None
+        elif name not in known:
+            yield text, text
+        else:
+            yield _nouns_result(known[name], text)
+
+def get_unprocessed_ingredients(engine, fetch_size=10000):
+    """
+    Stream ingredients that haven't been processed yet, fetch_size rows at a time.
+
+    Uses a server-side cursor (no table reflection), so memory stays constant
+    however large the backlog is. Yields lists of (IngredientId, Name) rows.
+    """
+    # NOLOCK on the results table: rows inserted meanwhile belong to ingredients this
+    # cursor has already passed, and the reader must not wait on the writer's locks
+    query = text(f"""
+        SELECT i.IngredientId, i.Name
+        FROM {DB_CONFIG['schema']}.{DB_CONFIG['ingredients_table']} i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {DB_CONFIG['schema']}.{DB_CONFIG['results_table']} p WITH (NOLOCK)
+            WHERE p.IngredientId = i.IngredientId
         )
-    ).where(
-        processed.c.IngredientId == None
-    )
+        ORDER BY i.IngredientId
+    """)
     
     with engine.connect() as conn:
-        result = conn.execute(query)
-        return result.fetchall()
+        result = conn.execution_options(stream_results=True, yield_per=fetch_size).execute(query)
+        for partition in result.partitions():
+            yield partition
+
+def build_token_lexicon(engine, fetch_size=10000, nlp_batch_size=NLP_BATCH_SIZE, n_process=NLP_PROCESSES):
+    """Seed the token lexicon (and the noun cache) by tagging the names already in the results table"""
+    lexicon = get_token_lexicon()
+    cache = get_noun_cache()
+    query = text(f"SELECT DISTINCT OriginalName FROM {DB_CONFIG['schema']}.{DB_CONFIG['results_table']}")
+    seen = set()
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=fetch_size).execute(query)
+        for partition in result.partitions():
+            names = {normalize_name(row.OriginalName) for row in partition if row.OriginalName} - seen
+            names = [name for name in names if name]
+            seen.update(names)
+            if not names:
+                continue
+            processes = n_process if len(names) >= nlp_batch_size * n_process else 1
+            parsed = {}
+            for name, doc in zip(names, get_nlp().pipe(names, batch_size=nlp_batch_size, n_process=processes)):
+                lexicon.observe(doc)
+                parsed[name] = _noun_lemmas(doc)
+            lexicon.save()
+            cache.put_many(parsed)
+    print(f"Token lexicon built from {len(seen)} processed names: {len(lexicon)} tokens")
 
-def process_ingredients():
+def process_ingredients(batch_size=1000, fetch_size=10000, nlp_batch_size=NLP_BATCH_SIZE, n_process=NLP_PROCESSES):
     """Main processing function with incremental update support"""
     engine = get_db_engine()
+    insert_stmt = f"""
+    INSERT INTO {DB_CONFIG['schema']}.{DB_CONFIG['results_table']} 
+    (IngredientId, OriginalName, LastNoun, Processed)
+    VALUES (:IngredientId, :OriginalName, :LastNoun, :AllNouns)
+    """
     
     try:
-        # Get only unprocessed ingredients
-        unprocessed = get_unprocessed_ingredients(engine)
-        
-        if not unprocessed:
-            print("No new ingredients to process")
-            return
-            
-        print(f"Found {len(unprocessed)} new ingredients to process...")
-        
-        # Process in batches
-        batch_size = 100
-        for i in range(0, len(unprocessed), batch_size):
-            batch = unprocessed[i:i + batch_size]
-            processed_data = []
-            
-            for id, name in batch:
-                try:
-                    last_noun, all_nouns = extract_nouns(name)
-                    processed_data.append({
+        total = 0
+        # Get only unprocessed ingredients, one fetch_size chunk in memory at a time
+        for unprocessed in get_unprocessed_ingredients(engine, fetch_size):
+            if not total and not len(get_token_lexicon()):
+                # First run with the fast path: learn the vocabulary from earlier results
+                build_token_lexicon(engine, fetch_size, nlp_batch_size, n_process)
+            # One pipeline pass per chunk, written in batches
+            results = extract_nouns_batch([name for _, name in unprocessed],
+                                          batch_size=nlp_batch_size, n_process=n_process)
+            for i in range(0, len(unprocessed), batch_size):
+                batch = unprocessed[i:i + batch_size]
+                processed_data = [
+                    {
                         'IngredientId': id,
                         'OriginalName': name,
                         'LastNoun': last_noun,
                         'AllNouns': all_nouns
-                    })
-                except Exception as e:
-                    processed_data.append({
-                        'IngredientId': id,
-                        'OriginalName': name,
-                        'LastNoun': name,
-                        'AllNouns': name
-                    })
-            
-            # Insert batch into database
-            if processed_data:
-                insert_stmt = f"""
-                INSERT INTO {DB_CONFIG['schema']}.{DB_CONFIG['results_table']} 
-                (IngredientId, OriginalName, LastNoun, Processed)
-                VALUES (:IngredientId, :OriginalName, :LastNoun, :AllNouns)
-                """
-                with engine.begin() as conn:
-                    conn.execute(text(insert_stmt), processed_data)
-            
-            print(f"Processed {min(i + batch_size, len(unprocessed))}/{len(unprocessed)}")
+                    }
+                    for (id, name), (last_noun, all_nouns) in zip(batch, islice(results, len(batch)))
+                ]
+                
+                # Insert batch into database
+                if processed_data:
+                    with engine.begin() as conn:
+                        conn.execute(text(insert_stmt), processed_data)
+                
+                total += len(batch)
+                print(f"Processed {total}")
+        
+        if not total:
+            print("No new ingredients to process")
+            return
         
-        print("Processing complete!")
+        cache = get_noun_cache()
+        print(f"Processing complete! {total} ingredients; noun cache: {cache.hits} hits, {cache.misses} misses")
+        print(get_token_lexicon().report())
         
     except SQLAlchemyError as e:
         print(f"Database error: {e}")
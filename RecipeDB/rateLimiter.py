@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Interface used by SpoonacularCrawler to throttle API calls.
+
+    acquire()/acquire_async() are called before every request and update() after
+    every response. The default implementation never waits, so any object with
+    these methods can be plugged into the crawler.
+
+    Attributes:
+        exhausted (bool): True once the API key has no quota left for today
+    """
+    def __init__(self):
+        self.exhausted = False
+
+    def acquire(self):
+        pass
+
+    async def acquire_async(self):
+        pass
+
+    def update(self, status_code, headers):
+        """Feed back a response; returns True if the request should be retried"""
+        return False
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    """
+    Token bucket whose refill rate adapts to Spoonacular's quota feedback.
+
+    The rate grows additively on every successful response and is halved on
+    HTTP 429, pausing the bucket for Retry-After seconds. HTTP 402, or an
+    X-API-Quota-Left header below min_quota_left, marks the daily quota as
+    exhausted so the crawler can stop instead of dropping recipes.
+
+    Usage:
+        limiter = TokenBucketRateLimiter(rate=1.0, max_rate=20.0)
+        crawler = SpoonacularCrawler(..., rate_limiter=limiter)
+
+    Attributes:
+        rate (float): Current requests per second
+        burst (int): Maximum tokens the bucket can hold
+        min_rate (float): Lower bound for rate after repeated 429s
+        max_rate (float): Upper bound for rate while quota is left
+        increase_step (float): Requests per second added on every success
+        min_quota_left (float): Quota points below which the key counts as exhausted
+        quota_left (float): Last X-API-Quota-Left value seen (None until known)
+    """
+    def __init__(self, rate=1.0, burst=5, min_rate=0.2, max_rate=20.0,
+                 increase_step=0.1, min_quota_left=1.0):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.min_quota_left = min_quota_left
+        self.quota_left = None
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take one token (possibly going into debt) and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, status_code, headers):
+        quota_left = headers.get('X-API-Quota-Left')
+        with self._lock:
+            if quota_left is not None:
+                try:
+                    self.quota_left = float(quota_left)
+                except ValueError:
+                    pass
+
+            if status_code == 402 or (self.quota_left is not None and self.quota_left < self.min_quota_left):
+                self.exhausted = True
+                return False
+
+            if status_code == 429:
+                self.rate = max(self.min_rate, self.rate / 2)
+                try:
+                    retry_after = float(headers.get('Retry-After', 0))
+                except ValueError:
+                    retry_after = 0.0
+                pause = max(retry_after, 1.0 / self.rate)
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                self._tokens = min(self._tokens, 0.0)
+                return True
+
+            if 200 <= status_code < 300:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+            return False
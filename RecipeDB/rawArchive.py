@@ -0,0 +1,271 @@
+# Append-only, compressed archive for raw Spoonacular responses.
+# Records live in segment files on local disk; RawRecipeData keeps only a pointer
+# ("segment:offset:length") in its archiveRef column instead of the full JSON text.
+# Run this script directly to move existing RawRecipeData.rawResponse rows into the archive.
+
+import os
+import json
+import zlib
+import struct
+import threading
+import pyodbc
+
+RECORD_MAGIC = b'RRA1'
+# magic, recipe id, compressed payload length, crc32 of payload
+RECORD_HEADER = struct.Struct('<4sqII')
+# recipe id, record offset, record length
+INDEX_ENTRY = struct.Struct('<qQI')
+
+
+class RawRecipeArchive:
+    """
+    Store raw recipe responses as zlib-compressed records in append-only segment files.
+
+    Each writer session appends to a segment file of its own (segment-000001.seg,
+    segment-000002.seg, ...), so several crawler processes can share one archive
+    directory. Next to each segment an .idx file maps recipe ids to record
+    positions; it is rebuilt from the segment if missing. Records are compressed
+    one by one, so random reads touch a single record while scan() streams whole
+    segments sequentially.
+
+    Usage:
+        archive = RawRecipeArchive("./raw_archive")
+        pointer = archive.append(recipe_id, response)
+        archive.flush()                 # before committing the pointer to the DB
+        response = archive.read(pointer)
+        response = archive.get(recipe_id)
+        for recipe_id, response in archive.scan():
+            ...
+
+    Attributes:
+        path (str): Directory holding the segment and index files
+        max_segment_bytes (int): Segment size at which a new segment is started
+        compression_level (int): zlib compression level (default 6)
+        index (dict): recipe id -> (segment, offset, length), latest record wins
+    """
+    def __init__(self, path, max_segment_bytes=256 * 1024 * 1024, compression_level=6):
+        self.path = path
+        self.max_segment_bytes = max_segment_bytes
+        self.compression_level = compression_level
+        os.makedirs(self.path, exist_ok=True)
+
+        self.index = {}
+        self._readers = {}
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_file = None
+        self._index_file = None
+        self._load_index()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.index
+
+    @staticmethod
+    def format_pointer(segment, offset, length):
+        return f"{segment}:{offset}:{length}"
+
+    @staticmethod
+    def parse_pointer(pointer):
+        segment, offset, length = pointer.rsplit(':', 2)
+        return segment, int(offset), int(length)
+
+    def segments(self):
+        """Segment names in the order they were written"""
+        return sorted(name[:-4] for name in os.listdir(self.path) if name.endswith('.seg'))
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"{segment}.seg")
+
+    def _index_path(self, segment):
+        return os.path.join(self.path, f"{segment}.idx")
+
+    def _load_index(self):
+        for segment in self.segments():
+            index_path = self._index_path(segment)
+            if os.path.exists(index_path):
+                with open(index_path, 'rb') as f:
+                    data = f.read()
+                # Ignore a partially written trailing entry
+                usable = len(data) - len(data) % INDEX_ENTRY.size
+                for recipe_id, offset, length in INDEX_ENTRY.iter_unpack(data[:usable]):
+                    self.index[recipe_id] = (segment, offset, length)
+            else:
+                print(f"Rebuilding index for archive segment {segment}")
+                with open(index_path, 'wb') as f:
+                    for recipe_id, offset, length in self._walk_segment(segment):
+                        self.index[recipe_id] = (segment, offset, length)
+                        f.write(INDEX_ENTRY.pack(recipe_id, offset, length))
+
+    def _walk_segment(self, segment, with_payload=False):
+        """Yield (recipe_id, offset, length[, payload]) for every complete record in a segment"""
+        with open(self._segment_path(segment), 'rb') as f:
+            offset = 0
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                magic, recipe_id, payload_length, crc = RECORD_HEADER.unpack(header)
+                if magic != RECORD_MAGIC:
+                    print(f"Corrupt record in archive segment {segment} at offset {offset}, stopping")
+                    return
+                length = RECORD_HEADER.size + payload_length
+                if with_payload:
+                    payload = f.read(payload_length)
+                    if len(payload) < payload_length or zlib.crc32(payload) != crc:
+                        # Truncated tail from an interrupted write
+                        return
+                    yield recipe_id, offset, length, payload
+                else:
+                    f.seek(payload_length, os.SEEK_CUR)
+                    yield recipe_id, offset, length
+                offset += length
+
+    def _open_new_segment(self):
+        """Claim the next free segment number; O_EXCL keeps concurrent writers apart"""
+        existing = self.segments()
+        number = int(existing[-1].split('-')[1]) + 1 if existing else 1
+        while True:
+            segment = f"segment-{number:06d}"
+            try:
+                fd = os.open(self._segment_path(segment), os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0))
+                break
+            except FileExistsError:
+                number += 1
+        self.close_writer()
+        self._segment = segment
+        self._segment_file = os.fdopen(fd, 'wb')
+        self._index_file = open(self._index_path(segment), 'ab')
+
+    def append(self, recipe_id, response):
+        """Compress and append one response, returning its pointer"""
+        payload = zlib.compress(json.dumps(response).encode('utf-8'), self.compression_level)
+        record = RECORD_HEADER.pack(RECORD_MAGIC, recipe_id, len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._segment_file is None or self._segment_file.tell() + len(record) > self.max_segment_bytes:
+                self._open_new_segment()
+            offset = self._segment_file.tell()
+            self._segment_file.write(record)
+            self._index_file.write(INDEX_ENTRY.pack(recipe_id, offset, len(record)))
+            self.index[recipe_id] = (self._segment, offset, len(record))
+            return self.format_pointer(self._segment, offset, len(record))
+
+    def flush(self):
+        """Make appended records durable; call before committing their pointers"""
+        with self._lock:
+            for f in (self._segment_file, self._index_file):
+                if f is not None:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _decode(self, record):
+        magic, recipe_id, payload_length, crc = RECORD_HEADER.unpack_from(record)
+        payload = record[RECORD_HEADER.size:RECORD_HEADER.size + payload_length]
+        if magic != RECORD_MAGIC or zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt archive record for recipe {recipe_id}")
+        return json.loads(zlib.decompress(payload))
+
+    def read(self, pointer):
+        """Read one response by its pointer string"""
+        segment, offset, length = self.parse_pointer(pointer)
+        with self._lock:
+            if self._segment == segment:
+                self._segment_file.flush()
+            reader = self._readers.get(segment)
+            if reader is None:
+                reader = self._readers[segment] = open(self._segment_path(segment), 'rb')
+            reader.seek(offset)
+            record = reader.read(length)
+        return self._decode(record)
+
+    def get(self, recipe_id):
+        """Read the latest response stored for recipe_id, or None if it isn't archived"""
+        location = self.index.get(recipe_id)
+        if location is None:
+            return None
+        return self.read(self.format_pointer(*location))
+
+    def scan(self):
+        """Yield (recipe_id, response) for every record, segment by segment in write order"""
+        self.flush()
+        for segment in self.segments():
+            for recipe_id, _, _, payload in self._walk_segment(segment, with_payload=True):
+                yield recipe_id, json.loads(zlib.decompress(payload))
+
+    def close_writer(self):
+        for f in (self._segment_file, self._index_file):
+            if f is not None:
+                f.close()
+        self._segment = self._segment_file = self._index_file = None
+
+    def close(self):
+        with self._lock:
+            self.close_writer()
+            for reader in self._readers.values():
+                reader.close()
+            self._readers = {}
+
+
+def load_raw_response(raw_response, archive_ref, archive=None):
+    """Return the parsed response of a RawRecipeData row, whether inline or archived"""
+    if archive_ref:
+        if archive is None:
+            raise ValueError(f"Row points into the raw archive ({archive_ref}) but no archive was given")
+        return archive.read(archive_ref)
+    return json.loads(raw_response) if raw_response else None
+
+
+def migrate_raw_recipe_data(db_connection_string, archive, batch_size=500):
+    """Move inline RawRecipeData.rawResponse values into the archive, keeping only pointers"""
+    conn = pyodbc.connect(db_connection_string)
+    cursor = conn.cursor()
+    update_cursor = conn.cursor()
+    update_cursor.fast_executemany = True
+
+    last_id = 0
+    total = 0
+    try:
+        while True:
+            cursor.execute("""
+                SELECT TOP (?) recipeId, rawResponse
+                FROM RawRecipeData
+                WHERE rawResponse IS NOT NULL AND archiveRef IS NULL AND recipeId > ?
+                ORDER BY recipeId
+            """, batch_size, last_id)
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            updates = [(archive.append(row.recipeId, json.loads(row.rawResponse)), row.recipeId) for row in rows]
+            archive.flush()
+            update_cursor.executemany("""
+                UPDATE RawRecipeData
+                SET archiveRef = ?, rawResponse = NULL
+                WHERE recipeId = ?
+            """, updates)
+            conn.commit()
+
+            last_id = rows[-1].recipeId
+            total += len(rows)
+            print(f"Archived {total} raw responses (up to recipe {last_id})")
+    finally:
+        cursor.close()
+        update_cursor.close()
+        conn.close()
+
+    print(f"Completed archiving {total} raw responses.")
+
+
+# Configuration
+DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=RecipeDB;Trusted_Connection=yes;"
+RAW_ARCHIVE_PATH = "./raw_archive"  # Directory holding the archive segment files
+
+if __name__ == "__main__":
+    archive = RawRecipeArchive(RAW_ARCHIVE_PATH)
+    try:
+        migrate_raw_recipe_data(DB_CONNECTION_STRING, archive)
+    finally:
+        archive.close()
@@ -0,0 +1,305 @@
+import json
+import pyodbc
+from datetime import datetime, timezone
+
+RECIPE_COLUMNS = (
+    'id', 'image', 'title', 'readyInMinutes', 'servings', 'sourceUrl', 'sourceName',
+    'vegetarian', 'vegan', 'preparationMinutes', 'cookingMinutes',
+    'glutenFree', 'veryPopular', 'aggregateLikes', 'instructions', 'fetchDateTime',
+    'imageDownloaded', 'imageFileType'
+)
+
+INGREDIENT_COLUMNS = (
+    'recipeId', 'ingredientId', 'name', 'nameClean',
+    'original', 'originalName', 'amount', 'unit'
+)
+
+# Columns a re-parse must not overwrite on existing rows
+PRESERVED_COLUMNS = ('fetchDateTime', 'imageDownloaded', 'imageFileType')
+
+RECIPE_MERGE_SQL = f"""
+    MERGE INTO Recipes AS target
+    USING (SELECT {', '.join(f'? AS {column}' for column in RECIPE_COLUMNS)}) AS source
+    ON target.id = source.id
+    WHEN MATCHED THEN UPDATE SET
+        {', '.join(f'{column} = source.{column}' for column in RECIPE_COLUMNS if column != 'id' and column not in PRESERVED_COLUMNS)}
+    WHEN NOT MATCHED THEN INSERT ({', '.join(RECIPE_COLUMNS)})
+        VALUES ({', '.join(f'source.{column}' for column in RECIPE_COLUMNS)});
+"""
+
+def lookup_key(name):
+    """Cuisines/DishTypes names compare case-insensitively and ignore trailing spaces in SQL Server"""
+    return name.strip().casefold()
+
+def _unique_names(names):
+    """Stripped names without the ones SQL Server would treat as duplicates, first spelling kept"""
+    unique = {}
+    for name in names or []:
+        if isinstance(name, str) and name.strip():
+            unique.setdefault(lookup_key(name), name.strip())
+    return list(unique.values())
+
+def parse_recipe(response, fetch_time=None, image_file_type=None):
+    """
+    Turn a Spoonacular recipe response into rows for Recipes and its child tables.
+
+    The result only holds plain tuples and lists so it can be passed between processes.
+
+    Returns:
+        dict with 'id', 'recipe' (tuple in RECIPE_COLUMNS order), 'ingredients'
+        (tuples in INGREDIENT_COLUMNS order), 'cuisines' and 'dishTypes' (names)
+    """
+    recipe_id = response.get('id')
+    recipe = (
+        recipe_id,
+        response.get('image'),
+        response.get('title'),
+        response.get('readyInMinutes'),
+        response.get('servings'),
+        response.get('sourceUrl'),
+        response.get('sourceName'),
+        response.get('vegetarian', False),
+        response.get('vegan', False),
+        response.get('preparationMinutes'),
+        response.get('cookingMinutes'),
+        response.get('glutenFree', False),
+        response.get('veryPopular', False),
+        response.get('aggregateLikes'),
+        response.get('instructions'),
+        fetch_time or datetime.now(timezone.utc),
+        image_file_type is not None,
+        image_file_type
+    )
+
+    ingredients = [
+        (
+            recipe_id,
+            ingredient.get('id'),
+            ingredient.get('name'),
+            ingredient.get('nameClean'),
+            ingredient.get('original'),
+            ingredient.get('originalName'),
+            ingredient.get('amount'),
+            ingredient.get('unit')
+        )
+        for ingredient in response.get('extendedIngredients') or []
+    ]
+
+    return {
+        'id': recipe_id,
+        'recipe': recipe,
+        'ingredients': ingredients,
+        # Drop duplicates so the (recipeId, cuisineId) primary keys can't collide
+        'cuisines': _unique_names(response.get('cuisines')),
+        'dishTypes': _unique_names(response.get('dishTypes'))
+    }
+
+
+class RecipeBatchWriter:
+    """
+    Set-based writer for parsed recipes.
+
+    Recipes are collected with add() and written by flush() in one transaction,
+    one fast_executemany call per table. Cuisines/DishTypes name->id lookups are
+    cached in process, so known names cost no round trips at all. If a batch
+    fails it is rolled back and retried one recipe at a time, so a single bad
+    recipe does not lose the rest of the batch. A recipe whose parsed rows still
+    fail (or that can't be parsed at all) keeps its RawRecipeData row, so it is
+    not fetched again and the backfill can repair it.
+
+    With a RawRecipeArchive, raw responses go to the archive and RawRecipeData
+    only stores the pointer in archiveRef.
+
+    With replace_existing=True (used by the backfill), existing Recipes rows are
+    updated in place and their child rows rewritten. Image columns, fetchDateTime
+    and rows that reference Recipes (e.g. RecipeUrlStatus) are left untouched.
+
+    Usage:
+        writer = RecipeBatchWriter(conn, archive=None)
+        for recipe_id, response in fetched:
+            writer.add(recipe_id, response, raw_response=response)
+        saved_ids = writer.flush()
+
+    Attributes:
+        conn: pyodbc connection the writer commits on
+        cursor: cursor with fast_executemany enabled
+        archive: optional RawRecipeArchive for raw responses
+        replace_existing (bool): Rewrite recipes that are already stored
+        pending (list): Parsed recipes waiting for the next flush()
+    """
+    def __init__(self, conn, archive=None, replace_existing=False):
+        self.conn = conn
+        self.archive = archive
+        self.replace_existing = replace_existing
+        self.cursor = conn.cursor()
+        self.cursor.fast_executemany = True
+        self.pending = []
+        self._lookup_cache = {'Cuisines': None, 'DishTypes': None}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, recipe_id, response, raw_response=None, image_file_type=None):
+        """Queue a recipe; raw_response is also written to RawRecipeData when given"""
+        try:
+            parsed = parse_recipe(response, image_file_type=image_file_type)
+        except Exception as e:
+            print(f"Unexpected error with recipe {recipe_id}: {str(e)}")
+            # Keep the paid response so the backfill can repair the recipe later
+            if raw_response is not None:
+                self._write_raw(recipe_id, self.raw_row(recipe_id, raw_response, datetime.now(timezone.utc)))
+            return False
+        raw = None
+        if raw_response is not None:
+            raw = self.raw_row(recipe_id, raw_response, parsed['recipe'][RECIPE_COLUMNS.index('fetchDateTime')])
+        self.add_parsed(parsed, raw)
+        return True
+
+    def add_parsed(self, parsed, raw=None):
+        """Queue a recipe already run through parse_recipe; raw is a raw_row() tuple"""
+        self.pending.append((parsed, raw))
+
+    def raw_row(self, recipe_id, raw_response, fetch_time):
+        """Build the RawRecipeData row for a response, archiving it first if an archive is set"""
+        if self.archive is not None:
+            return (recipe_id, None, fetch_time, self.archive.append(recipe_id, raw_response))
+        return (recipe_id, json.dumps(raw_response), fetch_time)
+
+    def flush(self):
+        """Write all pending recipes and return the ids that were saved"""
+        items, self.pending = self.pending, []
+        if not items:
+            return []
+
+        try:
+            self._write(items)
+            return [parsed['id'] for parsed, _ in items]
+        except pyodbc.Error as e:
+            self.conn.rollback()
+            if len(items) > 1:
+                print(f"Batch of {len(items)} recipes failed ({str(e)}), retrying one by one")
+
+        saved = []
+        for parsed, raw in items:
+            try:
+                self._write([(parsed, raw)])
+                saved.append(parsed['id'])
+            except pyodbc.Error as e:
+                print(f"Database error with recipe {parsed['id']}: {str(e)}")
+                self.conn.rollback()
+                # The parsed rows are bad, but the raw response is still worth keeping:
+                # it marks the ID as fetched and gives the backfill something to repair
+                if raw is not None:
+                    self._write_raw(parsed['id'], raw)
+        return saved
+
+    def _write_raw(self, recipe_id, raw):
+        """Commit a RawRecipeData row on its own; returns False if that fails too"""
+        try:
+            self.cursor.execute(self.raw_insert_sql(), *raw)
+            self.conn.commit()
+            return True
+        except pyodbc.Error as e:
+            print(f"Error saving raw response for recipe {recipe_id}: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    def _write(self, items):
+        raw_rows = [raw for _, raw in items if raw is not None]
+        recipe_rows = [parsed['recipe'] for parsed, _ in items]
+        ingredient_rows = [row for parsed, _ in items for row in parsed['ingredients']]
+
+        cuisine_ids = self._lookup_ids('Cuisines', {name for parsed, _ in items for name in parsed['cuisines']})
+        dish_type_ids = self._lookup_ids('DishTypes', {name for parsed, _ in items for name in parsed['dishTypes']})
+        cuisine_rows = [(parsed['id'], cuisine_ids[name]) for parsed, _ in items for name in parsed['cuisines']]
+        dish_type_rows = [(parsed['id'], dish_type_ids[name]) for parsed, _ in items for name in parsed['dishTypes']]
+
+        if raw_rows:
+            self.cursor.executemany(self.raw_insert_sql(), raw_rows)
+
+        if self.replace_existing:
+            # Stage the ids once and delete each child table with one join instead of one statement per recipe
+            self.cursor.execute("""
+                IF OBJECT_ID('tempdb..#ReplaceRecipeIds') IS NULL
+                    CREATE TABLE #ReplaceRecipeIds (id INT PRIMARY KEY);
+                TRUNCATE TABLE #ReplaceRecipeIds;
+            """)
+            self.cursor.executemany(
+                "INSERT INTO #ReplaceRecipeIds (id) VALUES (?)",
+                [(recipe_id,) for recipe_id in dict.fromkeys(parsed['id'] for parsed, _ in items)]
+            )
+            for table in ('RecipeIngredients', 'RecipeCuisines', 'RecipeDishTypes'):
+                self.cursor.execute(f"""
+                    DELETE child FROM {table} AS child
+                    JOIN #ReplaceRecipeIds AS ids ON child.recipeId = ids.id
+                """)
+            self.cursor.executemany(RECIPE_MERGE_SQL, recipe_rows)
+        else:
+            self.cursor.executemany(f"""
+                INSERT INTO Recipes ({', '.join(RECIPE_COLUMNS)})
+                VALUES ({', '.join('?' * len(RECIPE_COLUMNS))})
+            """, recipe_rows)
+
+        if ingredient_rows:
+            self.cursor.executemany(f"""
+                INSERT INTO RecipeIngredients ({', '.join(INGREDIENT_COLUMNS)})
+                VALUES ({', '.join('?' * len(INGREDIENT_COLUMNS))})
+            """, ingredient_rows)
+
+        if cuisine_rows:
+            self.cursor.executemany("""
+                INSERT INTO RecipeCuisines (recipeId, cuisineId)
+                VALUES (?, ?)
+            """, cuisine_rows)
+
+        if dish_type_rows:
+            self.cursor.executemany("""
+                INSERT INTO RecipeDishTypes (recipeId, dishTypeId)
+                VALUES (?, ?)
+            """, dish_type_rows)
+
+        self.conn.commit()
+        # Only trust ids created in this transaction once it is committed
+        self._lookup_cache['Cuisines'].update({lookup_key(name): row_id for name, row_id in cuisine_ids.items()})
+        self._lookup_cache['DishTypes'].update({lookup_key(name): row_id for name, row_id in dish_type_ids.items()})
+
+    def raw_insert_sql(self):
+        if self.archive is not None:
+            # Archived records must be on disk before the pointers are committed
+            self.archive.flush()
+            return """
+                INSERT INTO RawRecipeData (recipeId, rawResponse, fetchDateTime, archiveRef)
+                VALUES (?, ?, ?, ?)
+            """
+        return """
+            INSERT INTO RawRecipeData (recipeId, rawResponse, fetchDateTime)
+            VALUES (?, ?, ?)
+        """
+
+    def _lookup_ids(self, table, names):
+        """Resolve lookup-table names to ids, inserting the ones not seen before"""
+        cache = self._lookup_cache[table]
+        if cache is None:
+            self.cursor.execute(f"SELECT name, id FROM {table}")
+            cache = self._lookup_cache[table] = {lookup_key(name): row_id for name, row_id in self.cursor.fetchall()}
+
+        ids = {name: cache[lookup_key(name)] for name in names if lookup_key(name) in cache}
+        missing = [name for name in names if lookup_key(name) not in cache]
+        if missing:
+            self.cursor.executemany(f"""
+                MERGE INTO {table} WITH (HOLDLOCK) AS target
+                USING (SELECT ? AS name) AS source
+                ON target.name = source.name
+                WHEN NOT MATCHED THEN INSERT (name) VALUES (source.name);
+            """, [(name,) for name in missing])
+            placeholders = ', '.join('?' * len(missing))
+            self.cursor.execute(f"SELECT name, id FROM {table} WHERE name IN ({placeholders})", missing)
+            # SQL Server compares names case-insensitively, so match the returned rows the same way
+            found = {lookup_key(name): row_id for name, row_id in self.cursor.fetchall()}
+            for name in missing:
+                row_id = found.get(lookup_key(name))
+                if row_id is None:
+                    # Fail like a database error so flush() rolls back and retries per recipe
+                    raise pyodbc.Error(f"No {table} row matched {name!r}")
+                ids[name] = row_id
+        return ids
@@ -1,85 +1,106 @@
-import os
-import requests
+import asyncio
+import itertools
 import time
+import requests
+import aiohttp
 import pyodbc
-import json
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urlparse
+from rateLimiter import TokenBucketRateLimiter
+from recipeWriter import RecipeBatchWriter
+from rawArchive import RawRecipeArchive
+from imageDownloader import ImageDownloader
+from idRanges import IdRangeSet
+from crawlMetrics import CrawlMetrics, timed
+from workLeases import WorkLeaseManager
 
 class SpoonacularCrawler:
     def __init__(self, api_key, db_connection_string, image_storage_path, 
-                 max_workers=1, request_timeout=30):
+                 max_workers=1, request_timeout=30, rate_limiter=None, max_rate_limit_retries=5,
+                 raw_archive_path=None, image_workers=8, metrics_path=None, progress_interval=None,
+                 db_connect=pyodbc.connect):
         self.api_key = api_key
         self.db_connection_string = db_connection_string
         self.image_storage_path = image_storage_path
         self.max_workers = max_workers
         self.request_timeout = request_timeout
+        self.session = requests.Session()
+        self.rate_limiter = rate_limiter or TokenBucketRateLimiter()
+        self.max_rate_limit_retries = max_rate_limit_retries
         self.base_url = "https://api.spoonacular.com/recipes/{recipe_id}/information?includeNutrition=false&apiKey={api_key}"
         
-        # Ensure image storage directory exists
-        os.makedirs(self.image_storage_path, exist_ok=True)
+        # Per-stage latency and counters; written to metrics_path (.prom or JSON) after each crawl
+        self.metrics = CrawlMetrics()
+        self.metrics_path = metrics_path
+        self.progress_interval = progress_interval
+
+        # Images are downloaded by a separate stage with its own concurrency
+        self.images = ImageDownloader(db_connection_string, image_storage_path,
+                                      max_workers=image_workers, request_timeout=request_timeout,
+                                      metrics=self.metrics, db_connect=db_connect)
         
         # Initialize database connection
-        self.conn = pyodbc.connect(db_connection_string)
+        self.conn = db_connect(db_connection_string)
         self.cursor = self.conn.cursor()
-        self.processed_ids = self._load_processed_ids()
+        # Raw responses go to local segment files when an archive path is given
+        self.archive = RawRecipeArchive(raw_archive_path) if raw_archive_path else None
+        self.writer = RecipeBatchWriter(self.conn, archive=self.archive)
+        # Loaded when a crawl starts
+        self.processed_ids = IdRangeSet()
+        # Set while a crawl owns self.metrics, so crawl_leased reports all its ranges as one run
+        self._metrics_running = False
+
+    def _load_processed_ids(self, start_id=None, end_id=None):
+        """Load already processed recipe IDs from start_id..end_id as contiguous ID runs"""
+        return IdRangeSet.load(self.cursor, "RawRecipeData", "recipeId", start_id, end_id)
 
-    def _load_processed_ids(self):
-        """Load all already processed recipe IDs from database"""
-        self.cursor.execute("SELECT recipeId FROM RawRecipeData")
-        return {row[0] for row in self.cursor.fetchall()}
+    def _mark_image_downloaded(self, recipe_id, file_ext):
+        """Update database with download status"""
+        self.cursor.execute("""
+            UPDATE Recipes 
+            SET imageDownloaded = 1, imageFileType = ?
+            WHERE id = ?
+        """, file_ext, recipe_id)
+        self.conn.commit()
 
     def download_image(self, recipe_id, image_url):
         if not image_url:
             return False, None
         
-        try:
-            # Get the image file extension from URL
-            parsed = urlparse(image_url)
-            file_ext = os.path.splitext(parsed.path)[1].lower()
-            if not file_ext:
-                return False, None
-                
-            # Remove leading dot if present
-            file_ext = file_ext[1:] if file_ext.startswith('.') else file_ext
-            
-            # Create filename
-            filename = f"{recipe_id}.{file_ext}"
-            filepath = os.path.join(self.image_storage_path, filename)
-            
-            # Download the image
-            response = requests.get(image_url, stream=True, timeout=self.request_timeout)
-            if response.status_code == 200:
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(1024):
-                        f.write(chunk)
-                
-                # Update database with download status
-                self.cursor.execute("""
-                    UPDATE Recipes 
-                    SET imageDownloaded = 1, imageFileType = ?
-                    WHERE id = ?
-                """, file_ext, recipe_id)
-                self.conn.commit()
-                
-                return True, file_ext
+        file_ext = self.images.download(recipe_id, image_url)
+        if not file_ext:
             return False, None
-            
+
+        try:
+            self._mark_image_downloaded(recipe_id, file_ext)
+            return True, file_ext
         except Exception as e:
             print(f"Error downloading image for recipe {recipe_id}: {str(e)}")
             return False, None
    
     
+    @timed('fetch_recipe')
     def fetch_recipe(self, recipe_id):
         url = self.base_url.format(recipe_id=recipe_id, api_key=self.api_key)
         try:
-            response = requests.get(url, timeout=self.request_timeout)
+            for attempt in range(self.max_rate_limit_retries + 1):
+                self.rate_limiter.acquire()
+                response = self.session.get(url, timeout=self.request_timeout)
+                retry = self.rate_limiter.update(response.status_code, response.headers)
+                if not retry or attempt == self.max_rate_limit_retries:
+                    break
+                self.metrics.increment('rate_limited')
+                print(f"Rate limited on recipe {recipe_id}, retrying")
+
             if response.status_code == 200:
                 return recipe_id, response.json()
             elif response.status_code == 404:
+                self.metrics.increment('recipes_not_found')
                 print(f"Recipe {recipe_id} not found")
                 return recipe_id, None
+            elif response.status_code == 402:
+                print(f"Daily API quota exhausted at recipe {recipe_id}")
+                return recipe_id, None
             else:
                 print(f"Error fetching recipe {recipe_id}: HTTP {response.status_code}")
                 return recipe_id, None
@@ -90,15 +111,14 @@ class SpoonacularCrawler:
             print(f"Error fetching recipe {recipe_id}: {str(e)}")
             return recipe_id, None
     
+    @timed('save_raw_response')
     def save_raw_response(self, recipe_id, response):
         if response is None:
             return False
         
         try:
-            self.cursor.execute("""
-                INSERT INTO RawRecipeData (recipeId, rawResponse, fetchDateTime)
-                VALUES (?, ?, ?)
-            """, recipe_id, json.dumps(response), datetime.now(timezone.utc))
+            raw_row = self.writer.raw_row(recipe_id, response, datetime.now(timezone.utc))
+            self.cursor.execute(self.writer.raw_insert_sql(), *raw_row)
             self.conn.commit()
             return True
         except pyodbc.Error as e:
@@ -106,120 +126,15 @@ class SpoonacularCrawler:
             self.conn.rollback()
             return False
     
+    @timed('parse_and_save_recipe')
     def parse_and_save_recipe(self, recipe_id, response):
         if response is None:
             return False
-        
-        try:
-            # Extract all recipe data including new fields
-            recipe_data = {
-                'id': response.get('id'),
-                'image': response.get('image'),
-                'title': response.get('title'),
-                'readyInMinutes': response.get('readyInMinutes'),
-                'servings': response.get('servings'),
-                'sourceUrl': response.get('sourceUrl'),
-                'sourceName': response.get('sourceName'),
-                'vegetarian': response.get('vegetarian', False),
-                'vegan': response.get('vegan', False),
-                'preparationMinutes': response.get('preparationMinutes'),
-                'cookingMinutes': response.get('cookingMinutes'),
-                'glutenFree': response.get('glutenFree', False),
-                'veryPopular': response.get('veryPopular', False),
-                'aggregateLikes': response.get('aggregateLikes'),
-                'instructions': response.get('instructions'),
-                'fetchDateTime': datetime.now(timezone.utc)
-            }
-            
-            # Save recipe (updated with new fields)
-            self.cursor.execute("""
-                INSERT INTO Recipes (
-                    id, image, title, readyInMinutes, servings, sourceUrl, sourceName,
-                    vegetarian, vegan, preparationMinutes, cookingMinutes,
-                    glutenFree, veryPopular, aggregateLikes, instructions, fetchDateTime
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, *recipe_data.values())
-            
-            # Save ingredients (unchanged)
-            for ingredient in response.get('extendedIngredients', []):
-                ingredient_data = {
-                    'recipeId': recipe_data['id'],
-                    'ingredientId': ingredient.get('id'),
-                    'name': ingredient.get('name'),
-                    'nameClean': ingredient.get('nameClean'),
-                    'original': ingredient.get('original'),
-                    'originalName': ingredient.get('originalName'),
-                    'amount': ingredient.get('amount'),
-                    'unit': ingredient.get('unit')
-                }
-                
-                self.cursor.execute("""
-                    INSERT INTO RecipeIngredients (
-                        recipeId, ingredientId, name, nameClean, 
-                        original, originalName, amount, unit
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, *ingredient_data.values())
-            
-            # Save cuisines (array handling)
-            for cuisine in response.get('cuisines', []):
-                # Ensure cuisine exists in lookup table
-                self.cursor.execute("""
-                    MERGE INTO Cuisines WITH (HOLDLOCK) AS target
-                    USING (SELECT ? AS name) AS source
-                    ON target.name = source.name
-                    WHEN NOT MATCHED THEN INSERT (name) VALUES (source.name);
-                """, cuisine)
-                
-                # Get cuisine ID
-                self.cursor.execute("SELECT id FROM Cuisines WHERE name = ?", cuisine)
-                cuisine_id = self.cursor.fetchone()[0]
-                
-                # Link recipe to cuisine
-                self.cursor.execute("""
-                    INSERT INTO RecipeCuisines (recipeId, cuisineId)
-                    VALUES (?, ?)
-                """, recipe_data['id'], cuisine_id)
-            
-            # Save dish types (array handling)
-            for dish_type in response.get('dishTypes', []):
-                # Ensure dish type exists in lookup table
-                self.cursor.execute("""
-                    MERGE INTO DishTypes WITH (HOLDLOCK) AS target
-                    USING (SELECT ? AS name) AS source
-                    ON target.name = source.name
-                    WHEN NOT MATCHED THEN INSERT (name) VALUES (source.name);
-                """, dish_type)
-                
-                # Get dish type ID
-                self.cursor.execute("SELECT id FROM DishTypes WHERE name = ?", dish_type)
-                dish_type_id = self.cursor.fetchone()[0]
-                
-                # Link recipe to dish type
-                self.cursor.execute("""
-                    INSERT INTO RecipeDishTypes (recipeId, dishTypeId)
-                    VALUES (?, ?)
-                """, recipe_data['id'], dish_type_id)
-            
-            self.conn.commit()
-            return True
-            
-        except pyodbc.Error as e:
-            print(f"Database error with recipe {recipe_id}: {str(e)}")
-            self.conn.rollback()
-            return False
-        except Exception as e:
-            print(f"Unexpected error with recipe {recipe_id}: {str(e)}")
-            self.conn.rollback()
-            return False
-            
-        except pyodbc.Error as e:
-            print(f"Error parsing/saving recipe {recipe_id}: {str(e)}")
-            self.conn.rollback()
-            return False
-        except Exception as e:
-            print(f"Unexpected error with recipe {recipe_id}: {str(e)}")
-            self.conn.rollback()
+
+        # Single-recipe batch; crawl_recipes batches many recipes per flush instead
+        if not self.writer.add(recipe_id, response):
             return False
+        return recipe_id in self.writer.flush()
     
     def process_recipe(self, recipe_id):
         # Fetch recipe data
@@ -246,6 +161,38 @@ class SpoonacularCrawler:
         
         return True
 
+    @timed('save_batch')
+    def save_batch(self, fetched):
+        """Write (recipe_id, response) pairs in one transaction and queue their images; returns saved ids"""
+        for recipe_id, response in fetched:
+            self.writer.add(recipe_id, response, raw_response=response)
+        saved = self.writer.flush()
+        self.metrics.increment('recipes_saved', len(saved))
+        self.metrics.increment('recipes_failed', len(fetched) - len(saved))
+
+        responses = dict(fetched)
+        for recipe_id in saved:
+            self.images.submit(recipe_id, responses[recipe_id].get('image'))
+        return saved
+
+    def _start_metrics(self):
+        """Start a metrics run; returns False if an enclosing crawl (crawl_leased) already started one"""
+        if self._metrics_running:
+            return False
+        self._metrics_running = True
+        self.metrics.reset()
+        if self.progress_interval:
+            self.metrics.start_progress(self.progress_interval, self.metrics_path)
+        return True
+
+    def _finish_metrics(self):
+        self._metrics_running = False
+        self.metrics.stop_progress()
+        print(self.metrics.format_progress())
+        if self.metrics_path:
+            self.metrics.write(self.metrics_path)
+            print(f"Wrote crawl metrics to {self.metrics_path}")
+
     def get_last_recipe_id(self):
         """Get the highest recipe ID currently in the database"""
         self.cursor.execute("SELECT MAX(recipeId) FROM RawRecipeData")
@@ -253,17 +200,25 @@ class SpoonacularCrawler:
         return result[0] if result[0] is not None else 0
 
     
-    def crawl_recipes(self, start_id=None, number_to_crawl=1500, batch_size=100, force_retry_failed=False):
+    def crawl_recipes(self, start_id=None, number_to_crawl=1500, batch_size=100, force_retry_failed=False,
+                      end_id=None, stop_event=None):
         """
         Crawl recipes with smart defaults:
         - Defaults to 1500 recipes if number_to_crawl not specified
         - Starts from last recipe ID + 1 if start_id not specified
+        - Workers only fetch; each batch is saved by this thread in one transaction
+        - Images are downloaded by self.images alongside the crawl
         
         Args:
             start_id (int): First recipe ID to crawl (None to auto-detect)
             number_to_crawl (int): Total recipes to crawl (default 1500)
             batch_size (int): Number of recipes per batch (default 100)
             force_retry_failed (bool): Retry failed recipes (default False)
+            end_id (int): Last recipe ID to crawl (None for no upper bound)
+            stop_event (threading.Event): Stop after the current batch once set
+
+        Returns:
+            int: Number of recipes saved
         """
         # Determine starting ID
         if start_id is None:
@@ -275,17 +230,21 @@ class SpoonacularCrawler:
         last_successful_id = start_id - 1
         
         if force_retry_failed:
-            self.processed_ids = set()
+            self.processed_ids = IdRangeSet()
         else:
-            self.processed_ids = self._load_processed_ids()
+            self.processed_ids = self._load_processed_ids(start_id, end_id)
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        owns_metrics = self._start_metrics()
+        with self.images, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             while processed_count < number_to_crawl:
                 batch = []
                 # Prepare next batch
                 while len(batch) < batch_size and (processed_count + len(batch)) < number_to_crawl:
-                    if current_id not in self.processed_ids:
-                        batch.append(current_id)
+                    # Jump over whole runs of processed IDs
+                    current_id = self.processed_ids.next_gap(current_id)
+                    if end_id is not None and current_id > end_id:
+                        break
+                    batch.append(current_id)
                     current_id += 1
                 
                 if not batch:
@@ -294,32 +253,322 @@ class SpoonacularCrawler:
                 
                 print(f"Processing IDs {batch[0]} to {batch[-1]} ({processed_count}/{number_to_crawl} processed)")
                 
-                # Process batch
-                futures = {executor.submit(self.process_recipe, rid): rid for rid in batch}
+                # Fetch batch in the workers; only this thread touches the DB
+                fetched = []
+                claimed_at = time.perf_counter()
+                futures = {executor.submit(self.fetch_recipe, rid): rid for rid in batch}
                 for future in as_completed(futures):
                     rid = futures[future]
                     try:
-                        success = future.result()
-                        if success:
-                            processed_count += 1
-                            last_successful_id = rid
-                            self.processed_ids.add(rid)
+                        rid, response = future.result()
+                        if response:
+                            fetched.append((rid, response))
+                        else:
+                            self.metrics.increment('fetch_failed')
                     except Exception as e:
                         print(f"Error processing recipe {rid}: {str(e)}")
-                
-                time.sleep(1)  # Rate limiting
+
+                # Save the whole batch in one transaction
+                saved = self.save_batch(fetched)
+                batch_latency = time.perf_counter() - claimed_at
+                for rid in saved:
+                    self.metrics.observe('recipe_total', batch_latency)
+                    processed_count += 1
+                    last_successful_id = max(last_successful_id, rid)
+                    self.processed_ids.add(rid)
+
+                # Requests are paced by self.rate_limiter; stop once the daily quota is gone
+                if self.rate_limiter.exhausted:
+                    print("Stopping: daily API quota exhausted")
+                    break
+                if stop_event is not None and stop_event.is_set():
+                    print("Stopping: crawl was asked to stop")
+                    break
         
         print(f"Completed crawling {processed_count} recipes (target: {number_to_crawl})")
         print(f"Last successful ID: {last_successful_id}")
+        if owns_metrics:
+            self._finish_metrics()
+        return processed_count
     
+    async def _fetch_recipe_async(self, http, recipe_id):
+        """Async counterpart of fetch_recipe using the shared aiohttp session"""
+        url = self.base_url.format(recipe_id=recipe_id, api_key=self.api_key)
+        try:
+            for attempt in range(self.max_rate_limit_retries + 1):
+                await self.rate_limiter.acquire_async()
+                async with http.get(url) as response:
+                    retry = self.rate_limiter.update(response.status, response.headers)
+                    if retry and attempt < self.max_rate_limit_retries:
+                        self.metrics.increment('rate_limited')
+                        print(f"Rate limited on recipe {recipe_id}, retrying")
+                        continue
+                    if response.status == 200:
+                        return recipe_id, await response.json(content_type=None)
+                    elif response.status == 404:
+                        self.metrics.increment('recipes_not_found')
+                        print(f"Recipe {recipe_id} not found")
+                        return recipe_id, None
+                    elif response.status == 402:
+                        print(f"Daily API quota exhausted at recipe {recipe_id}")
+                        return recipe_id, None
+                    else:
+                        print(f"Error fetching recipe {recipe_id}: HTTP {response.status}")
+                        return recipe_id, None
+        except asyncio.TimeoutError:
+            print(f"Timeout fetching recipe {recipe_id}")
+            return recipe_id, None
+        except (aiohttp.ClientError, ValueError) as e:
+            print(f"Error fetching recipe {recipe_id}: {str(e)}")
+            return recipe_id, None
+
+    async def _crawl_worker(self, http, ids, progress, write_queue):
+        """Fetch recipes until the crawl target is covered"""
+        while True:
+            async with progress.changed:
+                # Wait while the in-flight recipes could still satisfy the target
+                await progress.changed.wait_for(progress.can_claim)
+                if progress.done():
+                    return
+                recipe_id = next(ids, None)
+                if recipe_id is None or (progress.stop_event is not None and progress.stop_event.is_set()):
+                    # Past end_id or asked to stop: let in-flight recipes finish, claim no more
+                    progress.stopped = True
+                    progress.changed.notify_all()
+                    return
+                progress.in_flight += 1
+                progress.claimed_at[recipe_id] = time.perf_counter()
+
+            with self.metrics.time('fetch_recipe'):
+                recipe_id, response = await self._fetch_recipe_async(http, recipe_id)
+            if self.rate_limiter.exhausted:
+                progress.stopped = True
+            if not response:
+                self.metrics.increment('fetch_failed')
+                await progress.settle(recipe_id, False)
+                continue
+
+            await write_queue.put((recipe_id, response))
+
+    async def _db_writer(self, progress, write_queue, batch_size):
+        """Single consumer that owns the DB connection; all cursor access happens here"""
+        finished = False
+        while not finished:
+            # Take whatever has queued up (at least one recipe) and save it as one batch
+            batch = [await write_queue.get()]
+            while len(batch) < batch_size and not write_queue.empty():
+                batch.append(write_queue.get_nowait())
+            if batch[-1] is None:
+                finished = True
+                batch.pop()
+            if not batch:
+                continue
+
+            try:
+                saved = set(await asyncio.to_thread(self.save_batch, batch))
+            except Exception:
+                # Nobody drains the queue after this: fail the batch and stop the workers
+                for recipe_id, _ in batch:
+                    await progress.settle(recipe_id, False)
+                async with progress.changed:
+                    progress.stopped = True
+                    progress.changed.notify_all()
+                raise
+            for recipe_id, _ in batch:
+                await progress.settle(recipe_id, recipe_id in saved)
+
+    async def crawl_recipes_async(self, start_id=None, number_to_crawl=1500, max_in_flight=10,
+                                  batch_size=100, force_retry_failed=False, end_id=None, stop_event=None):
+        """
+        Asyncio variant of crawl_recipes.
+
+        Recipe fetches share one keep-alive connection pool and at most max_in_flight
+        of them run at once. A single writer task owns the DB connection, so fetch
+        concurrency can grow without racing on self.cursor.
+
+        Args:
+            start_id (int): First recipe ID to crawl (None to auto-detect)
+            number_to_crawl (int): Total recipes to crawl (default 1500)
+            max_in_flight (int): Maximum concurrent recipe fetches (default 10)
+            batch_size (int): Maximum recipes saved per transaction (default 100)
+            force_retry_failed (bool): Retry failed recipes (default False)
+            end_id (int): Last recipe ID to crawl (None for no upper bound)
+            stop_event (threading.Event): Stop claiming new IDs once set
+
+        Returns:
+            int: Number of recipes saved
+        """
+        if start_id is None:
+            start_id = self.get_last_recipe_id() + 1
+            print(f"Auto-starting from recipe ID {start_id}")
+
+        if force_retry_failed:
+            self.processed_ids = IdRangeSet()
+        else:
+            self.processed_ids = self._load_processed_ids(start_id, end_id)
+
+        ids = self.processed_ids.iter_gaps(start_id)
+        if end_id is not None:
+            ids = itertools.takewhile(lambda rid: rid <= end_id, ids)
+        progress = _CrawlProgress(number_to_crawl, start_id - 1, self.processed_ids, self.metrics)
+        progress.stop_event = stop_event
+        write_queue = asyncio.Queue(maxsize=max(max_in_flight, batch_size))
+
+        connector = aiohttp.TCPConnector(limit=max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        owns_metrics = self._start_metrics()
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as http:
+            self.images.start()
+            writer = asyncio.create_task(self._db_writer(progress, write_queue, batch_size))
+            workers = [
+                asyncio.create_task(self._crawl_worker(http, ids, progress, write_queue))
+                for _ in range(max_in_flight)
+            ]
+            crawling = asyncio.gather(*workers)
+            try:
+                # The writer only returns early if it failed; then the workers are cancelled
+                await asyncio.wait([crawling, writer], return_when=asyncio.FIRST_COMPLETED)
+                if crawling.done():
+                    crawling.result()
+            finally:
+                crawling.cancel()
+                await asyncio.gather(crawling, return_exceptions=True)
+                try:
+                    if not writer.done():
+                        await write_queue.put(None)
+                    await writer
+                finally:
+                    await asyncio.to_thread(self.images.close)
+
+        if self.rate_limiter.exhausted:
+            print("Stopped early: daily API quota exhausted")
+        print(f"Completed crawling {progress.succeeded} recipes (target: {number_to_crawl})")
+        print(f"Last successful ID: {progress.last_successful_id}")
+        if owns_metrics:
+            self._finish_metrics()
+        return progress.succeeded
+
+    def crawl_leased(self, lease_manager, number_to_crawl=1500, use_async=True, max_in_flight=10,
+                     batch_size=100, initial_ranges=10):
+        """
+        Crawl ID ranges leased from the CrawlLease table until number_to_crawl recipes are saved.
+
+        Several processes or machines can run this at once: each range is leased
+        to one worker, kept alive by a heartbeat while it is crawled and marked
+        done afterwards. Ranges of crashed workers expire and are claimed again.
+        When no range is free, initial_ranges new ones are appended after the
+        last range (starting after MAX(recipeId) if the table is empty).
+
+        Args:
+            lease_manager (WorkLeaseManager): Lease table access for this worker
+            number_to_crawl (int): Stop claiming ranges once this many recipes are saved
+            use_async (bool): Crawl each range with crawl_recipes_async (default True)
+            max_in_flight (int): Concurrent fetches for the async engine
+            batch_size (int): Recipes per DB batch
+            initial_ranges (int): Ranges to append when none are available
+
+        Returns:
+            int: Number of recipes saved
+        """
+        total_saved = 0
+        # One metrics run for all ranges, not one per range
+        owns_metrics = self._start_metrics()
+        try:
+            while total_saved < number_to_crawl and not self.rate_limiter.exhausted:
+                lease = lease_manager.claim()
+                if lease is None:
+                    lease_manager.extend_ranges(self.get_last_recipe_id() + 1, initial_ranges)
+                    lease = lease_manager.claim()
+                    if lease is None:
+                        print("No recipe ID ranges left to lease")
+                        break
+
+                range_start, range_end = lease
+                range_size = range_end - range_start + 1
+                print(f"Leased IDs {range_start} to {range_end} as {lease_manager.owner}")
+                try:
+                    with lease_manager.heartbeat(lease) as heartbeat:
+                        if use_async:
+                            saved = asyncio.run(self.crawl_recipes_async(
+                                start_id=range_start, end_id=range_end, number_to_crawl=range_size,
+                                max_in_flight=max_in_flight, batch_size=batch_size, stop_event=heartbeat.lost))
+                        else:
+                            saved = self.crawl_recipes(
+                                start_id=range_start, end_id=range_end, number_to_crawl=range_size,
+                                batch_size=batch_size, stop_event=heartbeat.lost)
+                except BaseException:
+                    lease_manager.release(lease)
+                    raise
+
+                total_saved += saved
+                if self.rate_limiter.exhausted:
+                    # Unfinished range: hand it back for the next run
+                    lease_manager.release(lease)
+                elif not heartbeat.lost.is_set():
+                    lease_manager.complete(lease, saved)
+        finally:
+            if owns_metrics:
+                self._finish_metrics()
+
+        print(f"Completed leased crawl: {total_saved} recipes saved")
+        return total_saved
+
     def close(self):
+        self.session.close()
         self.cursor.close()
         self.conn.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+class _CrawlProgress:
+    """Shared counters for the async crawl, guarded by an asyncio.Condition"""
+    def __init__(self, target, last_successful_id, processed_ids, metrics):
+        self.target = target
+        self.succeeded = 0
+        self.in_flight = 0
+        self.last_successful_id = last_successful_id
+        self.processed_ids = processed_ids
+        self.stopped = False
+        self.stop_event = None
+        self.metrics = metrics
+        self.claimed_at = {}
+        self.changed = asyncio.Condition()
+
+    def done(self):
+        return self.stopped or self.succeeded >= self.target
+
+    def can_claim(self):
+        return self.done() or self.succeeded + self.in_flight < self.target
+
+    async def settle(self, recipe_id, success):
+        async with self.changed:
+            self.in_flight -= 1
+            claimed_at = self.claimed_at.pop(recipe_id, None)
+            if success:
+                if claimed_at is not None:
+                    # Claim to commit, the end-to-end latency of one recipe
+                    self.metrics.observe('recipe_total', time.perf_counter() - claimed_at)
+                self.succeeded += 1
+                self.last_successful_id = max(self.last_successful_id, recipe_id)
+                self.processed_ids.add(recipe_id)
+                if self.succeeded % 100 == 0:
+                    print(f"{self.succeeded}/{self.target} processed")
+            self.changed.notify_all()
 
 # Configuration
 API_KEY = "APIKEY"
 DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\\MSSQLLocalDB;DATABASE=RecipeDB;Trusted_Connection=yes;"
 IMAGE_STORAGE_PATH = "./recipe_images"  # Directory to store downloaded images
+IMAGE_WORKERS = 8  # Concurrent image downloads, independent of recipe fetches
+USE_ASYNC_CRAWL = True  # Crawl with the asyncio engine instead of the thread pool
+MAX_IN_FLIGHT = 10  # Concurrent recipe fetches for the asyncio engine
+REQUESTS_PER_SECOND = 1.0  # Starting rate; adapts to the API's quota headers
+MAX_REQUESTS_PER_SECOND = 20.0  # Ceiling for the adaptive rate
+METRICS_PATH = "./crawl_metrics.json"  # End-of-run metrics; use a .prom name for the Prometheus textfile collector
+PROGRESS_INTERVAL = 30  # Seconds between progress snapshots (None to disable)
+USE_WORK_LEASES = False  # Claim ID ranges from CrawlLease so several crawlers can run at once
+RAW_ARCHIVE_PATH = None  # Segment file directory for raw responses (needs the archiveRef column); None keeps them in RawRecipeData
 
 # Usage
 if __name__ == "__main__":
@@ -328,11 +577,25 @@ if __name__ == "__main__":
         db_connection_string=DB_CONNECTION_STRING,
         image_storage_path=IMAGE_STORAGE_PATH,
         max_workers=1,
-        request_timeout=30
+        request_timeout=30,
+        rate_limiter=TokenBucketRateLimiter(rate=REQUESTS_PER_SECOND, max_rate=MAX_REQUESTS_PER_SECOND),
+        raw_archive_path=RAW_ARCHIVE_PATH,
+        image_workers=IMAGE_WORKERS,
+        metrics_path=METRICS_PATH,
+        progress_interval=PROGRESS_INTERVAL
     )
     
     try:
         # Start crawling from Last crowled ID and crawled number_to_crawl records.
-        crawler.crawl_recipes(number_to_crawl=1400)
+        if USE_WORK_LEASES:
+            leases = WorkLeaseManager(DB_CONNECTION_STRING)
+            try:
+                crawler.crawl_leased(leases, number_to_crawl=1400, use_async=USE_ASYNC_CRAWL, max_in_flight=MAX_IN_FLIGHT)
+            finally:
+                leases.close()
+        elif USE_ASYNC_CRAWL:
+            asyncio.run(crawler.crawl_recipes_async(number_to_crawl=1400, max_in_flight=MAX_IN_FLIGHT))
+        else:
+            crawler.crawl_recipes(number_to_crawl=1400)
     finally:
         crawler.close()
\ No newline at end of file
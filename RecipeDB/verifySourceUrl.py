@@ -1,9 +1,22 @@
+import asyncio
+import time
+import heapq
+import random
+import threading
 import requests
+import aiohttp
+from requests.adapters import HTTPAdapter
 import pyodbc
+from urllib.parse import urlparse
+from domainHealth import DomainHealth, is_dns_error
 from datetime import datetime, timedelta, timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
 import argparse
 
+USER_AGENT = 'RecipeDB UrlValidator/1.0'
+HEAD_REJECTED_STATUSES = (405, 501)  # Site does not support HEAD; fall back to a ranged GET
+
 class UrlValidator:
     """
     A class to validate and monitor the accessibility of recipe source URLs in a database.
@@ -33,20 +46,53 @@ class UrlValidator:
     # Validate all URLs (including accessible ones, but RetryCount < 3 and NextCheckDate <= current time)
     validator.validate_urls(check_all=True)
 
+    # Async engine: pooled keep-alive connections per host, at most per_domain_limit checks per site
+    asyncio.run(validator.validate_urls_async(check_all=True))
+
+    # Long-running scheduler: checks flow at a steady 2 URLs/s, accessible URLs are re-checked weekly
+    validator.run_daemon(rate=2.0, recheck_days=7)
+
     # Command-line usage:
     # python verifySourceUrl.py --start_id 1000 --end_id 2000 --check_all
+    # python verifySourceUrl.py --daemon --rate 2
 
     Attributes:
         db_connection_string (str): ODBC connection string for the database
         timeout (int): HTTP request timeout in seconds (default: 10)
         max_workers (int): Maximum concurrent requests (default: 10)
+        per_domain_limit (int): Maximum concurrent requests to one site in the async engine (default: 2)
+        session: requests.Session reused by check_url so connections are kept alive
+        status_batch_size (int): Results buffered before a bulk status write (default: 500)
+        status_flush_interval (float): Seconds before a partial bulk write is forced (default: 5)
+        health (DomainHealth): Per-site circuit breaker and negative DNS filter shared by both engines
+        head_rejected (set): Sites that answered HEAD with 405/501; checked with a ranged GET instead
+        defer_seconds (int): How far URLs of a site with an open circuit are pushed back (default: 1 hour)
+        jitter (float): Random +/- fraction applied to backoff and re-check delays (default: 0.1)
         conn: Database connection object
         cursor: Database cursor object
     """
-    def __init__(self, db_connection_string, timeout=10, max_workers=10):
+    def __init__(self, db_connection_string, timeout=10, max_workers=10, per_domain_limit=2,
+                 status_batch_size=500, status_flush_interval=5.0, health=None, defer_seconds=3600,
+                 jitter=0.1):
         self.db_connection_string = db_connection_string
         self.timeout = timeout
         self.max_workers = max_workers
+        self.per_domain_limit = per_domain_limit
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.status_batch_size = status_batch_size
+        self.status_flush_interval = status_flush_interval
+        self.pending_status = []
+        self._last_status_flush = time.monotonic()
+        self._status_table_ready = False
+        self.head_rejected = set()
+        self.health = health or DomainHealth()
+        self.defer_seconds = defer_seconds
+        self.jitter = jitter
+        self.recheck_seconds = None
         self.conn = pyodbc.connect(db_connection_string)
         self.cursor = self.conn.cursor()
 
@@ -72,8 +118,14 @@ class UrlValidator:
         self.cursor.execute(query, params)
         self.conn.commit()
 
-    def check_url(self, recipe_id, url):
-        """Check URL accessibility with enhanced logic"""
+    def check_url(self, recipe_id, url, etag=None, last_modified=None, final_url=None):
+        """
+        Check URL accessibility with enhanced logic.
+
+        Known redirect targets are checked directly with If-None-Match /
+        If-Modified-Since, so an unchanged page costs one 304 and no redirect
+        chain. Sites that reject HEAD get a one-byte ranged GET instead.
+        """
         if not url or not url.strip():
             return {
                 'recipe_id': recipe_id,
@@ -83,45 +135,217 @@ class UrlValidator:
                 'retry_count': 0
             }
 
+        target = (final_url or url).strip()
+        headers = self._conditional_headers(etag, last_modified)
+        domain = self.domain_of(target)
         try:
-            response = requests.head(
-                url,
-                timeout=self.timeout,
-                allow_redirects=True,
-                headers={'User-Agent': 'RecipeDB UrlValidator/1.0'}
-            )
-            
-            is_accessible = 200 <= response.status_code < 400
-            return {
-                'recipe_id': recipe_id,
-                'status_code': response.status_code,
-                'is_accessible': is_accessible,
-                'error': None,
-                'retry_count': 0 if is_accessible else 1
-            }
+            response = None
+            if domain not in self.head_rejected:
+                response = self.session.head(
+                    target,
+                    timeout=self.timeout,
+                    allow_redirects=True,
+                    headers=headers
+                )
+                if response.status_code in HEAD_REJECTED_STATUSES:
+                    self.head_rejected.add(domain)
+                    response = None
+            if response is None:
+                with self.session.get(target, timeout=self.timeout, allow_redirects=True, stream=True,
+                                      headers={**headers, 'Range': 'bytes=0-0'}) as response:
+                    pass
+
+            result = self._check_result(recipe_id, response.status_code, response.headers, response.url,
+                                        etag, last_modified)
         except requests.RequestException as e:
-            return {
+            result = {
                 'recipe_id': recipe_id,
                 'status_code': None,
                 'is_accessible': False,
                 'error': str(e),
                 'retry_count': 1
             }
+            self._note_dns_error(target, e)
+        if not result['is_accessible'] and final_url and final_url != url:
+            # The stored redirect target may be stale; follow the chain from the source again
+            return self.check_url(recipe_id, url)
+        return result
 
-    def get_urls_to_check(self, batch_size=1000, start_id=None, end_id=None, check_all=False):
-        """Get URLs needing verification within ID range and RetryCount < 3"""
-        query = """
-            SELECT RecipeId, SourceUrl, RetryCount 
+    @staticmethod
+    def _conditional_headers(etag, last_modified):
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    @staticmethod
+    def _check_result(recipe_id, status_code, headers, final_url, etag, last_modified):
+        """Build a check result, keeping the validators and final URL for the next revalidation"""
+        is_accessible = 200 <= status_code < 400
+        not_modified = status_code == 304
+        return {
+            'recipe_id': recipe_id,
+            'status_code': status_code,
+            'is_accessible': is_accessible,
+            'error': None,
+            'retry_count': 0 if is_accessible else 1,
+            'etag': headers.get('ETag') or (etag if not_modified else None),
+            'last_modified': headers.get('Last-Modified') or (last_modified if not_modified else None),
+            'final_url': str(final_url) if is_accessible else None
+        }
+
+    @staticmethod
+    def domain_of(url):
+        """Site key used for per-domain limits: the lower-cased host without a leading www."""
+        host = (urlparse(url.strip()).hostname or '').lower()
+        return host[4:] if host.startswith('www.') else host
+
+    async def check_url_async(self, http, recipe_id, url, etag=None, last_modified=None, final_url=None):
+        """Async counterpart of check_url, using the shared aiohttp session"""
+        if not url or not url.strip():
+            return self.check_url(recipe_id, url)
+
+        target = (final_url or url).strip()
+        headers = self._conditional_headers(etag, last_modified)
+        domain = self.domain_of(target)
+        try:
+            result = None
+            if domain not in self.head_rejected:
+                async with http.head(target, allow_redirects=True, headers=headers) as response:
+                    if response.status in HEAD_REJECTED_STATUSES:
+                        self.head_rejected.add(domain)
+                    else:
+                        result = self._check_result(recipe_id, response.status, response.headers, response.url,
+                                                    etag, last_modified)
+            if result is None:
+                # The body is never read; leaving the block drops the rest of the byte range
+                async with http.get(target, allow_redirects=True,
+                                    headers={**headers, 'Range': 'bytes=0-0'}) as response:
+                    result = self._check_result(recipe_id, response.status, response.headers, response.url,
+                                                etag, last_modified)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            result = {
+                'recipe_id': recipe_id,
+                'status_code': None,
+                'is_accessible': False,
+                'error': str(e) or type(e).__name__,
+                'retry_count': 1
+            }
+            self._note_dns_error(target, e)
+        if not result['is_accessible'] and final_url and final_url != url:
+            return await self.check_url_async(http, recipe_id, url)
+        return result
+
+    def _deferred(self, recipe_id, domain):
+        """Result for a URL whose site has an open circuit: only NextCheckDate is moved"""
+        return {
+            'recipe_id': recipe_id,
+            'status_code': None,
+            'is_accessible': False,
+            'error': f'Circuit open for {domain}',
+            'retry_count': 0,
+            'deferred_until': datetime.now(timezone.utc) + timedelta(seconds=self.defer_seconds)
+        }
+
+    def _note_dns_error(self, url, error):
+        # The client's own lookup failed: later URLs of this host skip the request
+        if is_dns_error(error):
+            host = (urlparse(url).hostname or '').lower()
+            if host:
+                self.health.record_dns_failure(host)
+
+    @staticmethod
+    def _dns_failure(recipe_id, host):
+        return {
+            'recipe_id': recipe_id,
+            'status_code': None,
+            'is_accessible': False,
+            'error': f'DNS resolution failed for {host}',
+            'retry_count': 1
+        }
+
+    def _site_answered(self, result):
+        # 4xx still proves the site is up; only silence and 5xx count against it
+        return result['status_code'] is not None and result['status_code'] < 500
+
+    def check_url_guarded(self, recipe_id, url, etag=None, last_modified=None, final_url=None):
+        """check_url behind the site's circuit breaker and the negative DNS filter"""
+        host = (urlparse((url or '').strip()).hostname or '').lower()
+        if not host:
+            return self.check_url(recipe_id, url)
+        domain = self.domain_of(url)
+        decision = self.health.before_check(domain)
+        if decision == 'skip':
+            return self._deferred(recipe_id, domain)
+
+        try:
+            if self.health.unresolvable(host):
+                result = self._dns_failure(recipe_id, host)
+            else:
+                result = self.check_url(recipe_id, url, etag, last_modified, final_url)
+        except BaseException:
+            if decision == 'probe':
+                self.health.abandon_probe(domain)
+            raise
+        self.health.record(domain, self._site_answered(result), probe=(decision == 'probe'))
+        return result
+
+    async def _check_limited(self, http, row, domain_limits, in_flight):
+        """Wait for a slot on the URL's site first, so a busy site never holds global slots"""
+        host = (urlparse((row.SourceUrl or '').strip()).hostname or '').lower()
+        if not host:
+            return await self.check_url_async(http, row.RecipeId, row.SourceUrl)
+        domain = self.domain_of(row.SourceUrl)
+        domain_limit = domain_limits.get(domain)
+        if domain_limit is None:
+            domain_limit = domain_limits[domain] = asyncio.Semaphore(self.per_domain_limit)
+        async with domain_limit:
+            # Decided after the wait: the circuit may have opened meanwhile, and then
+            # the queued URLs of the site drain instantly without network calls
+            decision = self.health.before_check(domain)
+            if decision == 'skip':
+                return self._deferred(row.RecipeId, domain)
+            try:
+                async with in_flight:
+                    if self.health.unresolvable(host):
+                        result = self._dns_failure(row.RecipeId, host)
+                    else:
+                        result = await self.check_url_async(http, row.RecipeId, row.SourceUrl,
+                                                            row.ETag, row.LastModified, row.FinalUrl)
+            except BaseException:
+                # Cancelled or crashed mid-probe: without this the site would stay half-open forever
+                if decision == 'probe':
+                    self.health.abandon_probe(domain)
+                raise
+            self.health.record(domain, self._site_answered(result), probe=(decision == 'probe'))
+            return result
+
+    def get_urls_to_check(self, batch_size=1000, start_id=None, end_id=None, check_all=False,
+                          after_id=None, retried=False, cursor=None):
+        """
+        Get one keyset page of URLs needing verification within ID range and RetryCount < 3.
+
+        Pages are ordered by RecipeId and start after after_id, so each page is an
+        index seek instead of a re-sort of the whole table. retried selects URLs
+        that already failed (RetryCount 1-2) instead of unchecked ones (RetryCount 0).
+        """
+        query = f"""
+            SELECT TOP (?) RecipeId, SourceUrl, RetryCount, ETag, LastModified, FinalUrl
             FROM RecipeUrlStatus 
             WHERE 
                 (NextCheckDate IS NULL OR NextCheckDate <= GETDATE())
-                AND RetryCount < 3
+                AND {'RetryCount BETWEEN 1 AND 2' if retried else 'RetryCount = 0'}
             """
         
-        params = []
+        params = [batch_size]
         if not check_all:
             query += " AND IsAccessible = 0"
             
+        if after_id is not None:
+            query += " AND RecipeId > ?"
+            params.append(after_id)
         if start_id is not None:
             query += " AND RecipeId >= ?"
             params.append(start_id)
@@ -129,86 +353,446 @@ class UrlValidator:
             query += " AND RecipeId <= ?"
             params.append(end_id)
             
-        query += """
-            ORDER BY 
-                CASE WHEN RetryCount = 0 THEN 0 ELSE 1 END,
-                LastChecked ASC
-            """
-            
-        self.cursor.execute(query, params)
-        return self.cursor.fetchmany(batch_size)
+        query += " ORDER BY RecipeId"
+
+        cursor = cursor or self.cursor
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+    def iter_url_pages(self, page_size=1000, start_id=None, end_id=None, check_all=False):
+        """
+        Stream pages of URLs to check, never-checked URLs first, then retries.
+
+        Each candidate is visited once per run. Pages are read on a separate
+        connection so the bulk status writes can commit on self.conn meanwhile.
+        """
+        conn = pyodbc.connect(self.db_connection_string)
+        cursor = conn.cursor()
+        try:
+            for retried in (False, True):
+                after_id = None
+                while True:
+                    rows = self.get_urls_to_check(page_size, start_id, end_id, check_all,
+                                                  after_id=after_id, retried=retried, cursor=cursor)
+                    if not rows:
+                        break
+                    yield rows
+                    after_id = rows[-1].RecipeId
+        finally:
+            cursor.close()
+            conn.close()
+
+    def queue_status(self, result):
+        """Buffer a check result for the next bulk write; returns True when a flush is due"""
+        if result.get('deferred_until'):
+            self.pending_status.append((result['recipe_id'], None, None, None, None, 0, result['deferred_until'],
+                                        None, None, None, True))
+            return len(self.pending_status) >= self.status_batch_size
 
-    def update_status(self, result):
-        """Update tracking table with intelligent retry scheduling"""
         retry_count = result['retry_count']
         next_check = None
         
         if not result['is_accessible'] and retry_count > 0:
-            # Exponential backoff for retries (1h, 4h, 12h, 24h, 3d, 1w)
+            # Exponential backoff for retries (1h, 4h, 12h, 24h, 3d, 1w), jittered so re-checks don't cluster
             backoff_hours = min(168, [1, 4, 12, 24, 72, 168][min(retry_count-1, 5)])
-            next_check = datetime.now(timezone.utc) + timedelta(hours=backoff_hours)
+            next_check = datetime.now(timezone.utc) + timedelta(hours=backoff_hours * self._jitter_factor())
+        elif result['is_accessible'] and self.recheck_seconds:
+            # Daemon mode: accessible URLs come back after recheck_seconds
+            next_check = datetime.now(timezone.utc) + timedelta(seconds=self.recheck_seconds * self._jitter_factor())
+        result['next_check'] = next_check
 
-        self.cursor.execute("""
-            UPDATE RecipeUrlStatus 
-            SET 
-                IsAccessible = ?,
-                LastChecked = ?,
-                HttpStatus = ?,
-                ErrorMessage = ?,
-                RetryCount = RetryCount + ?,
-                NextCheckDate = ?
-            WHERE RecipeId = ?
-            """,
+        error = result['error'][:500] if result['error'] else None
+        self.pending_status.append((
+            result['recipe_id'],
             result['is_accessible'],
             datetime.now(timezone.utc),
             result['status_code'],
-            result['error'],
+            error,
             result['retry_count'],
             next_check,
-            result['recipe_id']
-        )
-        self.conn.commit()
+            (result.get('etag') or '')[:200] or None,
+            (result.get('last_modified') or '')[:50] or None,
+            (result.get('final_url') or '')[:1000] or None,
+            False
+        ))
+        return (len(self.pending_status) >= self.status_batch_size
+                or time.monotonic() - self._last_status_flush >= self.status_flush_interval)
+
+    def _jitter_factor(self):
+        return random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def update_status(self, result):
+        """Update tracking table with intelligent retry scheduling (written in bulk)"""
+        if self.queue_status(result):
+            self.flush_status()
+
+    def flush_status(self):
+        """
+        Write buffered results with one bulk insert into a temp table and one set-based UPDATE.
+
+        If the bulk write fails, the rows are retried one at a time, so a single
+        bad row does not throw away the other check results.
+        """
+        rows, self.pending_status = self.pending_status, []
+        self._last_status_flush = time.monotonic()
+        if not rows:
+            return
+        try:
+            self._write_status(rows)
+            return
+        except pyodbc.Error as e:
+            print(f"Error saving status for {len(rows)} URLs: {str(e)}")
+            if not self._reset_status_table() or len(rows) == 1:
+                return
+        print(f"Retrying {len(rows)} URL status updates one by one")
+        for row in rows:
+            try:
+                self._write_status([row])
+            except pyodbc.Error as e:
+                print(f"Error saving status for {row[0]}: {str(e)}")
+                if not self._reset_status_table():
+                    return
+
+    def _reset_status_table(self):
+        """Roll back and drop the temp table; returns False if the connection is unusable"""
+        try:
+            self.conn.rollback()
+            # The rollback may have undone the CREATE TABLE
+            self.cursor.execute("IF OBJECT_ID('tempdb..#UrlStatusUpdates') IS NOT NULL DROP TABLE #UrlStatusUpdates")
+            self.conn.commit()
+            return True
+        except pyodbc.Error as e:
+            print(f"Could not reset the status table: {str(e)}")
+            return False
+        finally:
+            self._status_table_ready = False
+
+    def _write_status(self, rows):
+        try:
+            if not self._status_table_ready:
+                self.cursor.execute("""
+                    CREATE TABLE #UrlStatusUpdates (
+                        RecipeId INT NOT NULL PRIMARY KEY,
+                        IsAccessible BIT NULL,
+                        LastChecked DATETIME2 NULL,
+                        HttpStatus INT NULL,
+                        ErrorMessage NVARCHAR(500) NULL,
+                        RetryIncrement INT NOT NULL,
+                        NextCheckDate DATETIME2 NULL,
+                        ETag NVARCHAR(200) NULL,
+                        LastModified VARCHAR(50) NULL,
+                        FinalUrl VARCHAR(1000) NULL,
+                        Deferred BIT NOT NULL
+                    )
+                    """)
+                self._status_table_ready = True
+            self.cursor.fast_executemany = True
+            self.cursor.executemany("""
+                INSERT INTO #UrlStatusUpdates
+                    (RecipeId, IsAccessible, LastChecked, HttpStatus, ErrorMessage, RetryIncrement,
+                     NextCheckDate, ETag, LastModified, FinalUrl, Deferred)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+            self.cursor.execute("""
+                UPDATE s
+                SET 
+                    IsAccessible = u.IsAccessible,
+                    LastChecked = u.LastChecked,
+                    HttpStatus = u.HttpStatus,
+                    ErrorMessage = u.ErrorMessage,
+                    RetryCount = s.RetryCount + u.RetryIncrement,
+                    NextCheckDate = u.NextCheckDate,
+                    ETag = u.ETag,
+                    LastModified = u.LastModified,
+                    FinalUrl = u.FinalUrl
+                FROM RecipeUrlStatus s
+                JOIN #UrlStatusUpdates u ON u.RecipeId = s.RecipeId
+                WHERE u.Deferred = 0
+                """)
+            # URLs of sites with an open circuit were not checked; only reschedule them
+            self.cursor.execute("""
+                UPDATE s
+                SET NextCheckDate = u.NextCheckDate
+                FROM RecipeUrlStatus s
+                JOIN #UrlStatusUpdates u ON u.RecipeId = s.RecipeId
+                WHERE u.Deferred = 1
+                """)
+            self.cursor.execute("DELETE FROM #UrlStatusUpdates")
+            self.conn.commit()
+        finally:
+            self.cursor.fast_executemany = False
 
     def validate_urls(self, start_id=None, end_id=None, check_all=False):
-        """Main validation process that processes ALL records in batches"""
+        """Main validation process: streams ALL candidate records through one long-lived thread pool"""
         mode = "all URLs" if check_all else "only inaccessible URLs"
         print(f"Starting URL validation for {mode} (IDs {start_id or 'start'} to {end_id or 'end'})...")
         self.initialize_url_tracking(start_id, end_id)
         
         total_processed = 0
-        while True:
-            urls_to_check = self.get_urls_to_check(
-                start_id=start_id, 
-                end_id=end_id, 
-                check_all=check_all
-            )
-            
-            if not urls_to_check:
-                break  # No more records to process
-                
-            batch_size = len(urls_to_check)
-            total_processed += batch_size
-            
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = {
-                    executor.submit(self.check_url, row.RecipeId, row.SourceUrl): row.RecipeId
-                    for row in urls_to_check
-                }
-                
-                for future in as_completed(futures):
-                    try:
-                        result = future.result()
-                        self.update_status(result)
+        max_pending = self.max_workers * 4
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            for page in self.iter_url_pages(start_id=start_id, end_id=end_id, check_all=check_all):
+                for row in page:
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        total_processed += self._finish_checks(done, pending)
+                    future = executor.submit(self.check_url_guarded, row.RecipeId, row.SourceUrl,
+                                             row.ETag, row.LastModified, row.FinalUrl)
+                    pending[future] = row.RecipeId
+                print(f"Queued page of {len(page)} URLs (checked so far: {total_processed})")
+            total_processed += self._finish_checks(list(pending), pending)
+
+        self.flush_status()
+        print(f"Completed validation of {total_processed} URLs in total.")
+
+    def _finish_checks(self, done, pending):
+        """Record finished futures of the thread pool engine; returns how many were handled"""
+        for future in done:
+            recipe_id = pending.pop(future)
+            try:
+                result = future.result()
+                self.update_status(result)
+                status = result['status_code'] or result['error'][:30]
+                print(f"Checked {result['recipe_id']} - Status: {status}")
+            except Exception as e:
+                print(f"Error processing {recipe_id}: {str(e)}")
+        return len(done)
+
+    async def validate_urls_async(self, start_id=None, end_id=None, check_all=False):
+        """
+        validate_urls on asyncio: one keep-alive connection pool per host, up to
+        max_workers checks in flight overall and per_domain_limit per site, so
+        many different sites are checked in parallel without hammering any one.
+        """
+        mode = "all URLs" if check_all else "only inaccessible URLs"
+        print(f"Starting async URL validation for {mode} (IDs {start_id or 'start'} to {end_id or 'end'})...")
+        self.initialize_url_tracking(start_id, end_id)
+
+        connector = aiohttp.TCPConnector(limit=self.max_workers, limit_per_host=self.per_domain_limit,
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        in_flight = asyncio.Semaphore(self.max_workers)
+        domain_limits = {}
+        total_processed = 0
+        max_pending = self.max_workers * 50
+        pages = self.iter_url_pages(start_id=start_id, end_id=end_id, check_all=check_all)
+        queued = deque()
+        pending = {}
+        exhausted = False
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={'User-Agent': USER_AGENT}) as http:
+            try:
+                while True:
+                    # Keep the window full; the next page is read only when the buffer runs dry
+                    while not exhausted and len(pending) < max_pending:
+                        if not queued:
+                            page = await asyncio.to_thread(next, pages, None)
+                            if page is None:
+                                exhausted = True
+                                break
+                            queued.extend(page)
+                        row = queued.popleft()
+                        task = asyncio.create_task(self._check_limited(http, row, domain_limits, in_flight))
+                        pending[task] = row.RecipeId
+                    if not pending:
+                        break
+
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        recipe_id = pending.pop(task)
+                        try:
+                            result = task.result()
+                        except Exception as e:
+                            # One broken check must not end the run, as in _finish_checks
+                            print(f"Error processing {recipe_id}: {str(e)}")
+                            continue
+                        total_processed += 1
                         status = result['status_code'] or result['error'][:30]
                         print(f"Checked {result['recipe_id']} - Status: {status}")
-                    except Exception as e:
-                        print(f"Error processing {futures[future]}: {str(e)}")
-
-            print(f"Processed batch of {batch_size} URLs (total: {total_processed})")
+                        if self.queue_status(result):
+                            # Checks keep running while the bulk write is in progress
+                            await asyncio.to_thread(self.flush_status)
+            finally:
+                pages.close()
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
 
+        await asyncio.to_thread(self.flush_status)
         print(f"Completed validation of {total_processed} URLs in total.")
 
+    @staticmethod
+    def _timestamp(value):
+        # NextCheckDate/LastChecked are written as UTC
+        return value.replace(tzinfo=timezone.utc).timestamp()
+
+    def _load_schedule(self):
+        """Min-heap of (due time, RecipeId) for every URL still monitored (RetryCount < 3)"""
+        now = time.time()
+        schedule = []
+        self.cursor.execute("""
+            SELECT RecipeId, NextCheckDate, LastChecked, IsAccessible
+            FROM RecipeUrlStatus
+            WHERE RetryCount < 3
+            """)
+        while True:
+            rows = self.cursor.fetchmany(10000)
+            if not rows:
+                break
+            for row in rows:
+                if row.NextCheckDate is not None:
+                    due = self._timestamp(row.NextCheckDate)
+                elif row.IsAccessible and row.LastChecked is not None:
+                    due = self._timestamp(row.LastChecked) + self.recheck_seconds * self._jitter_factor()
+                else:
+                    due = now
+                schedule.append((due, row.RecipeId))
+        heapq.heapify(schedule)
+        return schedule
+
+    def _fetch_high_water(self):
+        self.cursor.execute("SELECT MAX(fetchDateTime) FROM Recipes")
+        return self.cursor.fetchone()[0]
+
+    def _track_new_recipes(self, schedule, high_water, overlap_seconds=3600):
+        """
+        Start tracking recipes fetched since the high-water mark; they are due immediately.
+
+        The mark is a fetchDateTime, not a recipe ID: leased crawls fill lower ID
+        ranges after higher ones. fetchDateTime is stamped before the row commits,
+        so the scan reaches overlap_seconds behind the mark; NOT EXISTS skips the
+        recipes that are already tracked. Returns the new mark.
+        """
+        next_high_water = self._fetch_high_water()
+        self.cursor.execute("""
+            INSERT INTO RecipeUrlStatus (RecipeId, SourceUrl)
+            OUTPUT inserted.RecipeId
+            SELECT r.id, r.SourceUrl
+            FROM Recipes r
+            WHERE (? IS NULL OR r.fetchDateTime > DATEADD(second, ?, ?)) AND r.SourceUrl IS NOT NULL
+            AND NOT EXISTS (SELECT 1 FROM RecipeUrlStatus s WHERE s.RecipeId = r.id)
+            """, high_water, -overlap_seconds, high_water)
+        new_ids = [row.RecipeId for row in self.cursor.fetchall()]
+        self.conn.commit()
+        now = time.time()
+        for recipe_id in new_ids:
+            heapq.heappush(schedule, (now, recipe_id))
+        if new_ids:
+            print(f"Tracking {len(new_ids)} new recipe URLs")
+        return next_high_water if next_high_water is not None else high_water
+
+    def _load_due_rows(self, recipe_ids):
+        placeholders = ', '.join('?' * len(recipe_ids))
+        self.cursor.execute(f"""
+            SELECT RecipeId, SourceUrl, RetryCount, ETag, LastModified, FinalUrl
+            FROM RecipeUrlStatus
+            WHERE RecipeId IN ({placeholders}) AND RetryCount < 3
+            """, recipe_ids)
+        return self.cursor.fetchall()
+
+    def _reschedule(self, schedule, row, result):
+        """Put a checked URL back on the heap at the NextCheckDate that was just written"""
+        next_check = result.get('deferred_until') or result.get('next_check')
+        if next_check is None:
+            return
+        if not result.get('deferred_until') and row.RetryCount + result['retry_count'] >= 3:
+            return  # Given up on, as in batch mode
+        heapq.heappush(schedule, (next_check.timestamp(), row.RecipeId))
+
+    def run_daemon(self, rate=2.0, recheck_days=7, refresh_seconds=300, stop_event=None):
+        """
+        Check URLs continuously as they fall due instead of draining a backlog and exiting.
+
+        Due times are kept in an in-memory min-heap loaded once from RecipeUrlStatus.
+        Checks are started at a steady rate (URLs per second) on the thread pool,
+        and each result puts its URL back on the heap at the jittered NextCheckDate
+        written for it (accessible URLs after recheck_days). Every refresh_seconds
+        recipes fetched since a fetchDateTime high-water mark are added, so the
+        full NOT IN scan of initialize_url_tracking runs only once at start-up.
+
+        Args:
+            rate (float): URL checks started per second
+            recheck_days (float): Interval for re-checking accessible URLs
+            refresh_seconds (float): How often new recipes are picked up
+            stop_event (threading.Event): Set to stop the daemon (runs until interrupted otherwise)
+        """
+        self.recheck_seconds = recheck_days * 86400
+        stop_event = stop_event or threading.Event()
+        high_water = self._fetch_high_water()
+        self.initialize_url_tracking()
+        schedule = self._load_schedule()
+        print(f"URL daemon started: {len(schedule)} URLs scheduled, {rate} checks/s")
+
+        interval = 1.0 / rate
+        next_slot = time.monotonic()
+        next_refresh = time.monotonic() + refresh_seconds
+        ready = deque()
+        pending = {}
+        checked = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while not stop_event.is_set():
+                    if time.monotonic() >= next_refresh:
+                        high_water = self._track_new_recipes(schedule, high_water)
+                        next_refresh = time.monotonic() + refresh_seconds
+
+                    for future in [f for f in pending if f.done()]:
+                        row = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"Error processing {row.RecipeId}: {str(e)}")
+                            continue
+                        self.update_status(result)
+                        self._reschedule(schedule, row, result)
+                        checked += 1
+                        if checked % 1000 == 0:
+                            print(f"Checked {checked} URLs; {len(schedule)} scheduled")
+
+                    # Fetch details for the URLs due now, a second's worth at a time
+                    if not ready and schedule and schedule[0][0] <= time.time():
+                        due_ids = []
+                        while schedule and schedule[0][0] <= time.time() and len(due_ids) < max(1, int(rate)):
+                            due_ids.append(heapq.heappop(schedule)[1])
+                        ready.extend(self._load_due_rows(due_ids))
+
+                    if ready and len(pending) < self.max_workers * 2 and time.monotonic() >= next_slot:
+                        row = ready.popleft()
+                        future = executor.submit(self.check_url_guarded, row.RecipeId, row.SourceUrl,
+                                                 row.ETag, row.LastModified, row.FinalUrl)
+                        pending[future] = row
+                        next_slot = max(next_slot + interval, time.monotonic() - interval)
+                        continue
+
+                    if self.pending_status and time.monotonic() - self._last_status_flush >= self.status_flush_interval:
+                        self.flush_status()
+
+                    # Sleep until the next slot, the next due URL or a finished check
+                    wake = next_refresh - time.monotonic()
+                    if ready:
+                        wake = min(wake, next_slot - time.monotonic())
+                    elif schedule:
+                        wake = min(wake, schedule[0][0] - time.time())
+                    wake = min(max(wake, 0.01), 1.0)
+                    if pending:
+                        wait(pending, timeout=wake, return_when=FIRST_COMPLETED)
+                    else:
+                        stop_event.wait(wake)
+            except KeyboardInterrupt:
+                print("Stopping URL daemon...")
+            for future, row in pending.items():
+                try:
+                    self.update_status(future.result())
+                except Exception as e:
+                    print(f"Error processing {row.RecipeId}: {str(e)}")
+        self.flush_status()
+        print(f"URL daemon stopped after {checked} checks.")
+
     def close(self):
+        self.flush_status()
+        self.session.close()
         self.cursor.close()
         self.conn.close()
 
@@ -218,6 +802,14 @@ def parse_arguments():
     parser.add_argument('--end_id', type=int, help='Ending Recipe ID to process')
     parser.add_argument('--check_all', action='store_true', 
                        help='Check all URLs regardless of current accessibility status')
+    parser.add_argument('--max_workers', type=int, default=10, help='Maximum concurrent requests')
+    parser.add_argument('--per_domain_limit', type=int, default=2,
+                       help='Maximum concurrent requests to one site (async engine)')
+    parser.add_argument('--sync', action='store_true', help='Use the thread pool engine instead of asyncio')
+    parser.add_argument('--daemon', action='store_true', help='Keep running and check URLs as they fall due')
+    parser.add_argument('--rate', type=float, default=2.0, help='URL checks per second in daemon mode')
+    parser.add_argument('--recheck_days', type=float, default=7,
+                       help='Days before an accessible URL is re-checked in daemon mode')
     return parser.parse_args()
 
 # Configuration
@@ -225,12 +817,22 @@ DB_CONNECTION_STRING = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=(localdb)\
 
 if __name__ == "__main__":
     args = parse_arguments()
-    validator = UrlValidator(DB_CONNECTION_STRING)
+    validator = UrlValidator(DB_CONNECTION_STRING, max_workers=args.max_workers,
+                             per_domain_limit=args.per_domain_limit)
     try:
-        validator.validate_urls(
-            start_id=args.start_id, 
-            end_id=args.end_id, 
-            check_all=args.check_all
-        )
+        if args.daemon:
+            validator.run_daemon(rate=args.rate, recheck_days=args.recheck_days)
+        elif args.sync:
+            validator.validate_urls(
+                start_id=args.start_id, 
+                end_id=args.end_id, 
+                check_all=args.check_all
+            )
+        else:
+            asyncio.run(validator.validate_urls_async(
+                start_id=args.start_id,
+                end_id=args.end_id,
+                check_all=args.check_all
+            ))
     finally:
         validator.close()
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+import socket
+import threading
+import pyodbc
+
+
+class WorkLeaseManager:
+    """
+    Hand out disjoint recipe ID ranges to crawler processes through the CrawlLease table.
+
+    claim() atomically leases the lowest pending range, or one whose lease has
+    expired because its worker crashed, using UPDLOCK/READPAST so concurrent
+    claimers skip each other's rows instead of blocking. While a range is being
+    crawled a heartbeat thread keeps pushing LeaseExpires forward; complete()
+    marks it done and release() hands it back.
+
+    Usage:
+        leases = WorkLeaseManager(DB_CONNECTION_STRING)
+        leases.extend_ranges(first_id=1, count=10)
+        lease = leases.claim()
+        with leases.heartbeat(lease):
+            ...crawl lease[0]..lease[1]...
+        leases.complete(lease, saved)
+
+    Attributes:
+        db_connection_string (str): ODBC connection string for RecipeDB
+        owner (str): Worker identity stored on leased rows (host:pid by default)
+        lease_seconds (int): How long a lease lives without a heartbeat (default 300)
+        heartbeat_seconds (int): Interval between heartbeats (default 60)
+        range_size (int): IDs per range created by extend_ranges (default 1000)
+    """
+    def __init__(self, db_connection_string, owner=None, lease_seconds=300, heartbeat_seconds=60,
+                 range_size=1000):
+        self.db_connection_string = db_connection_string
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.range_size = range_size
+        self.conn = pyodbc.connect(db_connection_string)
+        self.cursor = self.conn.cursor()
+
+    def ensure_ranges(self, start_id, end_id):
+        """Create pending ranges covering start_id..end_id; existing ranges are left alone"""
+        rows = [
+            (range_start, min(range_start + self.range_size - 1, end_id))
+            for range_start in range(start_id, end_id + 1, self.range_size)
+        ]
+        self.cursor.executemany("""
+            MERGE INTO CrawlLease WITH (HOLDLOCK) AS target
+            USING (SELECT ? AS RangeStart, ? AS RangeEnd) AS source
+            ON target.RangeStart = source.RangeStart
+            WHEN NOT MATCHED THEN INSERT (RangeStart, RangeEnd, Status)
+                VALUES (source.RangeStart, source.RangeEnd, 'pending');
+        """, rows)
+        self.conn.commit()
+
+    def extend_ranges(self, first_id, count):
+        """Append count ranges after the last known range (or from first_id if there are none)"""
+        self.cursor.execute("SELECT MAX(RangeEnd) FROM CrawlLease")
+        last_end = self.cursor.fetchone()[0]
+        start_id = last_end + 1 if last_end is not None else first_id
+        self.ensure_ranges(start_id, start_id + count * self.range_size - 1)
+
+    def claim(self):
+        """Lease the next available range; returns (range_start, range_end) or None"""
+        self.cursor.execute("""
+            WITH next_range AS (
+                SELECT TOP (1) *
+                FROM CrawlLease WITH (UPDLOCK, READPAST, ROWLOCK)
+                WHERE Status = 'pending'
+                   OR (Status = 'leased' AND LeaseExpires < SYSUTCDATETIME())
+                ORDER BY RangeStart
+            )
+            UPDATE next_range
+            SET Status = 'leased',
+                Owner = ?,
+                LeaseExpires = DATEADD(second, ?, SYSUTCDATETIME()),
+                LastHeartbeat = SYSUTCDATETIME()
+            OUTPUT inserted.RangeStart, inserted.RangeEnd;
+        """, self.owner, self.lease_seconds)
+        row = self.cursor.fetchone()
+        self.conn.commit()
+        return (row[0], row[1]) if row else None
+
+    def renew(self, lease, cursor=None):
+        """Extend a lease; returns False if another worker has taken it over"""
+        cursor = cursor or self.cursor
+        cursor.execute("""
+            UPDATE CrawlLease
+            SET LeaseExpires = DATEADD(second, ?, SYSUTCDATETIME()),
+                LastHeartbeat = SYSUTCDATETIME()
+            WHERE RangeStart = ? AND Owner = ? AND Status = 'leased'
+        """, self.lease_seconds, lease[0], self.owner)
+        renewed = cursor.rowcount == 1
+        cursor.connection.commit()
+        return renewed
+
+    def complete(self, lease, recipes_saved):
+        """Mark a fully crawled range as done"""
+        self.cursor.execute("""
+            UPDATE CrawlLease
+            SET Status = 'done', CompletedAt = SYSUTCDATETIME(), RecipesSaved = ?
+            WHERE RangeStart = ? AND Owner = ? AND Status = 'leased'
+        """, recipes_saved, lease[0], self.owner)
+        completed = self.cursor.rowcount == 1
+        self.conn.commit()
+        if not completed:
+            print(f"Lease for IDs {lease[0]}-{lease[1]} was lost before completion; leaving it for its new owner")
+        return completed
+
+    def release(self, lease):
+        """Give an unfinished range back so another worker can pick it up"""
+        self.cursor.execute("""
+            UPDATE CrawlLease
+            SET Status = 'pending', Owner = NULL, LeaseExpires = NULL
+            WHERE RangeStart = ? AND Owner = ? AND Status = 'leased'
+        """, lease[0], self.owner)
+        self.conn.commit()
+
+    def heartbeat(self, lease):
+        return LeaseHeartbeat(self, lease)
+
+    def close(self):
+        self.cursor.close()
+        self.conn.close()
+
+
+class LeaseHeartbeat:
+    """Context manager that renews a lease on its own thread and connection"""
+    def __init__(self, manager, lease):
+        self.manager = manager
+        self.lease = lease
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        conn = pyodbc.connect(self.manager.db_connection_string)
+        cursor = conn.cursor()
+        try:
+            while not self._stop.wait(self.manager.heartbeat_seconds):
+                try:
+                    if not self.manager.renew(self.lease, cursor):
+                        print(f"Lost lease for IDs {self.lease[0]}-{self.lease[1]}")
+                        self.lost.set()
+                        return
+                except pyodbc.Error as e:
+                    # Keep trying; the lease only expires after lease_seconds
+                    print(f"Heartbeat failed for IDs {self.lease[0]}-{self.lease[1]}: {str(e)}")
+        finally:
+            cursor.close()
+            conn.close()